@@ -16,12 +16,18 @@
 #
 # NOTE: API key is NOT hardcoded; set OPENAI_API_KEY in your env/.env.
 
-import os, json, time, hashlib, datetime, subprocess, shlex, re, shutil
-from pathlib import Path
+import os, sys, json, time, hashlib, subprocess, shlex, re, shutil, atexit, random, mmap
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from pathlib import Path, PurePath
 from typing import Any, Dict, Optional, Tuple, List
-from subprocess import Popen, PIPE
 import requests
 from tqdm import tqdm
+try:
+    import orjson
+except Exception:
+    orjson = None
 
 APP_NAME = "Agent Martin OS"
 VERSION = "v1.4.7"
@@ -35,13 +41,19 @@ API_KEY = os.environ.get("OPENAI_API_KEY", "").strip()
 if not API_KEY:
     print("\033[93mMartin: Warning - OPENAI_API_KEY not set; API calls will fail.\033[0m")
 RESPONSES_URL = "https://api.openai.com/v1/responses"
-TIMEOUT_S = 60
+TIMEOUT_S = (5, 115)  # (connect, read); stays under the 120 s per-call budget
 HEADERS = {
     "Content-Type": "application/json",
     "Accept": "application/json",
     "Authorization": f"Bearer {API_KEY or ''}",
 }
 
+# One pooled keep-alive session for every Responses call; retries are handled in _post_responses.
+_SESSION = requests.Session()
+_SESSION.mount("https://", requests.adapters.HTTPAdapter(pool_connections=8, pool_maxsize=16, max_retries=0))
+_SESSION.headers.update(HEADERS)
+atexit.register(_SESSION.close)
+
 # ---- Model selection (env-overridable) ----
 MODEL_MAIN = os.getenv("MARTIN_MODEL_MAIN", "gpt-4.1")
 MODEL_MINI = os.getenv("MARTIN_MODEL_MINI", "gpt-4.1-mini")
@@ -51,11 +63,18 @@ SHOW_API_BARS = True
 ECHO_INTERACTIVE = False
 HEARTBEAT_SUMMARY_EVERY_S = 25
 HEARTBEAT_MIN_CHARS = 600
-MAX_RETRIES = 3
-BACKOFF_BASE_S = 0.75
+MAX_RETRIES = 5
+BACKOFF_JITTER_S = (2.0, 4.0)  # per-attempt sleep is uniform(lo, hi) * attempt
+RETRY_AFTER_CAP_S = 60.0
+RETRY_STATUS = {429, 500, 502, 503, 504, 524, 529}
+STREAM_LABELS = {"Reasoning", "Diagnosis", "Main"}  # long calls that could hit the 100 s edge timeout; Main also echoes live
+STREAM_TIMEOUT_S = (5, 300)
 CMD_TIMEOUT_S = 300
+LEDGER_FLUSH_EVERY = 32
+LEDGER_FLUSH_INTERVAL_S = 2.0
 
-interaction_history: List[str] = []
+HISTORY_TURNS = 5
+interaction_history: deque = deque(maxlen=HISTORY_TURNS)  # (speaker, text); only the recent tail is ever sent
 current_username = os.getenv("USER") or "pi"
 
 # ===== T1: State & Ledger =====
@@ -64,7 +83,8 @@ def _ensure_dirs() -> None:
     LOG_DIR.mkdir(parents=True, exist_ok=True)
 
 def _now_iso() -> str:
-    return datetime.datetime.utcnow().isoformat() + "Z"
+    t = time.time()
+    return time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(t)) + f".{int((t % 1) * 1e6):06d}Z"
 
 def _sha256_bytes(b: bytes) -> str:
     h = hashlib.sha256(); h.update(b); return h.hexdigest()
@@ -86,19 +106,42 @@ DEFAULT_STATE: Dict[str, Any] = {
     "workspace": {"path": "./workspace", "last_file": ""}
 }
 
+def _json_bytes(data: Any, indent: bool = False) -> bytes:
+    # orjson emits compact UTF-8 bytes; the stdlib fallback is configured to match it on plain data.
+    if orjson is not None:
+        opt = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0)
+        return orjson.dumps(data, option=opt)
+    if indent:
+        return json.dumps(data, indent=2, ensure_ascii=False).encode("utf-8")
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def _json_loads(raw) -> Any:
+    # Accepts bytes or str; both decoders handle either.
+    if orjson is not None:
+        try:
+            return orjson.loads(raw)
+        except orjson.JSONDecodeError:
+            # Stdlib json accepts NaN/Infinity, which state and ledger files written by it may contain.
+            pass
+    return json.loads(raw)
+
+def _json_text(data: Any, indent: bool = False) -> str:
+    return _json_bytes(data, indent=indent).decode("utf-8")
+
 def _read_json(path: Path, default: Any) -> Any:
     if not path.exists(): return default
     try:
-        with open(path, "r", encoding="utf-8") as f: return json.load(f)
+        with open(path, "rb") as f: return _json_loads(f.read())
     except Exception:
         return default
 
 def _write_json(path: Path, data: Any) -> None:
     tmp = path.with_suffix(path.suffix + ".tmp")
-    with open(tmp, "w", encoding="utf-8") as f: json.dump(data, f, indent=2, ensure_ascii=False)
+    with open(tmp, "wb") as f: f.write(_json_bytes(data, indent=True))
     os.replace(tmp, path)
 
 def load_state() -> Dict[str, Any]:
+    flush_ledger()
     st = _read_json(STATE_FILE, DEFAULT_STATE.copy())
     for k, v in DEFAULT_STATE.items():
         if k not in st: st[k] = v
@@ -106,21 +149,67 @@ def load_state() -> Dict[str, Any]:
     return st
 
 def save_state(st: Dict[str, Any]) -> None:
+    global _DIRTY_STATE
     _write_json(STATE_FILE, st)
+    if st is _DIRTY_STATE:
+        _DIRTY_STATE = None
+
+# One in-process state; mutations mark it dirty and it is written once per ledger burst or at exit.
+_STATE: Optional[Dict[str, Any]] = None
+_DIRTY_STATE: Optional[Dict[str, Any]] = None
+
+def get_state() -> Dict[str, Any]:
+    global _STATE
+    if _STATE is None:
+        _STATE = load_state()
+    return _STATE
+
+def mark_state_dirty(st: Optional[Dict[str, Any]] = None) -> None:
+    global _DIRTY_STATE
+    _DIRTY_STATE = st if st is not None else get_state()
+
+def flush_state() -> None:
+    if _DIRTY_STATE is not None:
+        save_state(_DIRTY_STATE)
 
 def _ledger_entry(event: str, data: Dict[str, Any]) -> Dict[str, Any]:
     return {"ts": _now_iso(), "version": VERSION, "event": event, "data": data}
 
+# Ledger lines are buffered and written in bursts; dirty state is saved with each burst.
+_LEDGER_BUF: List[bytes] = []
+_LEDGER_FH = None
+_LEDGER_LAST_FLUSH = time.monotonic()
+
+def flush_ledger() -> None:
+    global _LEDGER_FH, _LEDGER_LAST_FLUSH
+    _LEDGER_LAST_FLUSH = time.monotonic()
+    if _LEDGER_BUF:
+        if _LEDGER_FH is None:
+            _ensure_dirs()
+            _LEDGER_FH = open(LEDGER_FILE, "ab", buffering=1 << 16)
+        _LEDGER_FH.write(b"".join(_LEDGER_BUF))
+        _LEDGER_FH.flush()
+        os.fsync(_LEDGER_FH.fileno())
+        _LEDGER_BUF.clear()
+    flush_state()
+
+atexit.register(flush_ledger)
+
 def append_ledger(st: Dict[str, Any], entry: Dict[str, Any]) -> None:
-    _ensure_dirs()
     prev_hash = st["ledger"].get("last_hash")
-    payload = json.dumps(entry, ensure_ascii=False, separators=(",", ":"))
-    new_hash = _sha256_bytes(((prev_hash or "") + payload).encode("utf-8"))
-    line = json.dumps({"entry": entry, "prev_hash": prev_hash, "hash": new_hash}, ensure_ascii=False)
-    with open(LEDGER_FILE, "a", encoding="utf-8") as f: f.write(line + "\n")
+    payload = _json_bytes(entry)
+    h = hashlib.sha256(); h.update((prev_hash or "").encode("ascii")); h.update(payload)
+    new_hash = h.hexdigest()
+    # Wrap the already-encoded entry instead of serializing it a second time.
+    line = (b'{"entry":' + payload + b',"prev_hash":' + _json_bytes(prev_hash)
+            + b',"hash":"' + new_hash.encode("ascii") + b'"}\n')
+    _LEDGER_BUF.append(line)
     st["ledger"]["entries"] = int(st["ledger"].get("entries", 0)) + 1
     st["ledger"]["last_hash"] = new_hash
-    save_state(st)
+    mark_state_dirty(st)
+    if (len(_LEDGER_BUF) >= LEDGER_FLUSH_EVERY
+            or time.monotonic() - _LEDGER_LAST_FLUSH > LEDGER_FLUSH_INTERVAL_S):
+        flush_ledger()
 
 def log_event(st: Dict[str, Any], event: str, **data: Any) -> None:
     append_ledger(st, _ledger_entry(event, data))
@@ -141,21 +230,81 @@ class SessionCtx:
         self.st["last_session"] = {"started_at": self.started_at, "ended_at": ended_at,
                                    "num_commands": self.commands, "last_exit_code": self.last_rc, "summary": summary}
         save_state(self.st); log_event(self.st, "session_end", ended_at=ended_at, **summary)
+        flush_ledger()
 
 # ===== OpenAI Responses API helpers =====
 
-def _post_responses(payload, timeout=TIMEOUT_S, label="API"):
+def _retry_delay(attempt: int, retry_after: Optional[str] = None) -> float:
+    if retry_after:
+        try:
+            return min(float(retry_after), RETRY_AFTER_CAP_S)
+        except ValueError:
+            pass
+    return random.uniform(*BACKOFF_JITTER_S) * attempt
+
+def _read_sse(r, on_delta=None) -> Dict[str, Any]:
+    # Reassemble a streamed Responses reply into the {"output_text": ...} shape callers expect.
+    parts: List[str] = []
+    delivered = False
+    try:
+        for raw in r.iter_lines():
+            if not raw or not raw.startswith(b"data:"):
+                continue
+            data = raw[5:].strip()
+            if data == b"[DONE]":
+                break
+            try:
+                ev = _json_loads(data)
+            except ValueError:
+                ev = None
+            if not isinstance(ev, dict):
+                # The stream is already consumed, so report the offending line rather than r.text.
+                return {"error": {"message": "Invalid JSON from API",
+                                  "body": data.decode("utf-8", "replace")[:2000]}}
+            kind = ev.get("type")
+            if kind == "response.output_text.delta":
+                delta = ev.get("delta") or ""
+                parts.append(delta)
+                if on_delta and delta:
+                    on_delta(delta)
+                    delivered = True
+            elif kind == "response.completed":
+                break
+            elif kind in ("error", "response.failed"):
+                err = ev.get("error") or (ev.get("response") or {}).get("error")
+                return {"error": err or {"message": kind}}
+    except requests.RequestException as e:
+        if not delivered:
+            raise
+        # The caller already printed part of the reply; a retry would print it again from the start.
+        return {"output_text": "".join(parts),
+                "incomplete_details": {"reason": "stream_interrupted", "detail": str(e)}}
+    finally:
+        r.close()
+    return {"output_text": "".join(parts)}
+
+def _post_responses(payload, timeout=None, label="API", on_delta=None):
     last_err = None
     bar_ctx = tqdm(total=MAX_RETRIES, desc=label, unit="try", leave=False) if SHOW_API_BARS else None
+    stream = label in STREAM_LABELS
+    if stream:
+        payload = {**payload, "stream": True}
+    timeout = timeout or (STREAM_TIMEOUT_S if stream else TIMEOUT_S)
+    body = _json_bytes(payload)
     for attempt in range(1, MAX_RETRIES + 1):
+        retry_after = None
         try:
-            r = requests.post(RESPONSES_URL, headers=HEADERS, json=payload, timeout=timeout)
-            status = r.status_code; text = r.text or ""
+            r = _SESSION.post(RESPONSES_URL, data=body, timeout=timeout, stream=stream)
+            status = r.status_code
             if status == 200:
                 try:
-                    data = r.json()
+                    data = _read_sse(r, on_delta) if stream else _json_loads(r.content)
+                except requests.RequestException:
+                    raise
                 except Exception as e:
-                    last_err = {"message": "Invalid JSON from API", "detail": str(e), "body": text[:2000]}
+                    # A streamed body has been consumed and closed by _read_sse; r.text would raise.
+                    body = "" if stream else (r.text or "")[:2000]
+                    last_err = {"message": "Invalid JSON from API", "detail": str(e), "body": body}
                     if bar_ctx: bar_ctx.update(1)
                     break
                 if bar_ctx:
@@ -163,7 +312,7 @@ def _post_responses(payload, timeout=TIMEOUT_S, label="API"):
                 return data
             else:
                 try:
-                    j = r.json()
+                    j = _json_loads(r.content)
                 except Exception:
                     j = {}
                 api_err = j.get("error")
@@ -172,13 +321,16 @@ def _post_responses(payload, timeout=TIMEOUT_S, label="API"):
                                 "type": api_err.get("type"), "param": api_err.get("param"),
                                 "code": api_err.get("code"), "http_status": status}
                 else:
-                    last_err = {"message": f"HTTP {status}", "http_status": status, "body": text[:2000]}
+                    last_err = {"message": f"HTTP {status}", "http_status": status, "body": (r.text or "")[:2000]}
+                if status not in RETRY_STATUS:
+                    break
+                retry_after = r.headers.get("Retry-After")
         except requests.RequestException as e:
             last_err = {"message": "Network error", "detail": str(e)}
         if bar_ctx:
             bar_ctx.update(1)
         if attempt < MAX_RETRIES:
-            time.sleep(BACKOFF_BASE_S * (2 ** (attempt - 1)))
+            time.sleep(_retry_delay(attempt, retry_after))
     if bar_ctx:
         bar_ctx.close()
     return {"error": last_err or {"message": "Unknown error"}}
@@ -278,7 +430,7 @@ def get_thinking_gpt_response(prompt: str, error_message: str):
         f"DIRECTIVE: Provide current terminal commands for Raspbian when applicable. "
         f"Each command must start with 'command: '. Username is '{current_username}'."
     )
-    recent = "\n".join(interaction_history[-5:])
+    recent = "\n".join(f"{who}: {text}" for who, text in interaction_history)
     full_prompt = f"Error encountered: {error_message}\n{recent}\n{intro_message}\n{background_knowledge}\nUser request: {prompt}"
     payload = {
         "model": MODEL_MAIN,
@@ -297,56 +449,82 @@ def get_thinking_gpt_response(prompt: str, error_message: str):
 
 # ===== Command extraction / preprocess =====
 
-CMD_LINE_RE = re.compile(r"('im)^\s*command:\s*(.+')\s*$")
+CMD_LINE_RE = re.compile(r"(?im)^[ \t]*command:[ \t]*(.+?)[ \t]*$")
+assert CMD_LINE_RE.match("command: ls").group(1) == "ls", "CMD_LINE_RE regressed"
 
-def extract_commands(text: str, keyword="command:"):
-    commands = []
+# Internal ability invocation: "martin.<key> <payload>" or "martin.<key>:<payload>".
+INTERNAL_CMD_RE = re.compile(r"(?is)martin\.([^\s:]+)[ \t:]*(.*)")
+
+def extract_plan(text: str) -> List[Tuple[str, Optional[str], Optional[str]]]:
+    """One pass over the response: (cmd, internal_key, payload) per 'command:' line."""
+    plan = []
     cwd = None
-    for line in text.splitlines():
-        m = CMD_LINE_RE.match(line)
-        if not m:
-            continue
+    for m in CMD_LINE_RE.finditer(text):
         c = m.group(1).strip().strip("`")
-        if " | " in c:
-            c = c.split(" | ", 1)[0].strip()
-        if c.startswith("cd "):
+        im = INTERNAL_CMD_RE.fullmatch(c)
+        if im:
+            plan.append((c, im.group(1), im.group(2).strip()))
+        elif c.startswith("cd "):
             cwd = c[3:].strip()
-            commands.append(c)
+            plan.append((c, None, None))
         else:
-            commands.append(f"cd {cwd} && {c}" if cwd else c)
-    return commands
+            plan.append((f"cd {cwd} && {c}" if cwd else c, None, None))
+    return plan
+
+def reply_plan(resp_json: Dict[str, Any], text: str) -> List[Tuple[str, Optional[str], Optional[str]]]:
+    # A reply cut off mid-stream may end in a truncated command ("rm -rf build/tmp" -> "rm -rf build").
+    if isinstance(resp_json, dict) and resp_json.get("incomplete_details"):
+        return []
+    return extract_plan(text)
+
+def extract_commands(text: str, keyword="command:"):
+    return [c for c, _, _ in extract_plan(text)]
 
 SAFE_TEMP_ZONES = ["/tmp/", os.path.expanduser("~/Downloads/"), os.path.expanduser("~/build/"), os.path.expanduser("~/.cache/")]
 SAFE_DIR_NAMES = {"dist", "build", "node_modules", "venv"}
 SYSTEM_ZONES = ["/etc/", "/boot/", "/usr/", "/lib/", "/var/"]
 HOME_DOTFILES = {".bashrc", ".profile", ".zshrc", ".ssh"}
 
+@lru_cache(maxsize=2048)
 def _norm(p):
+    # Safe to memoize: Martin never chdirs; commands change directory only inside their own shells.
     return os.path.abspath(os.path.expandvars(os.path.expanduser(p)))
 
+_SAFE_TEMP_PATHS = tuple(PurePath(_norm(z)) for z in SAFE_TEMP_ZONES)
+_SYSTEM_PATHS = tuple(PurePath(_norm(z)) for z in SYSTEM_ZONES)
+_HOME_PATH = PurePath(os.path.expanduser("~"))
+
 def classify_overwrite_target(path):
-    ap = _norm(path)
-    for z in SAFE_TEMP_ZONES:
-        if ap.startswith(_norm(z)):
-            return {"zone": "safe", "auto_ok": True}
-    parts = ap.split(os.sep)
-    if any(seg in SAFE_DIR_NAMES for seg in parts):
+    # Component-wise checks: /tmpfoo is not under /tmp, and "build" must be a whole path segment.
+    p = PurePath(_norm(path))
+    if any(p.is_relative_to(z) for z in _SAFE_TEMP_PATHS):
+        return {"zone": "safe", "auto_ok": True}
+    if any(seg in SAFE_DIR_NAMES for seg in p.parts):
         return {"zone": "safe", "auto_ok": True}
-    for z in SYSTEM_ZONES:
-        if ap.startswith(_norm(z)):
-            return {"zone": "system", "auto_ok": False}
-    home = os.path.expanduser("~")
-    if ap.startswith(home + os.sep):
-        tail = ap[len(home) + 1:]
-        if tail.split(os.sep)[0] in HOME_DOTFILES:
+    if any(p.is_relative_to(z) for z in _SYSTEM_PATHS):
+        return {"zone": "system", "auto_ok": False}
+    if p != _HOME_PATH and p.is_relative_to(_HOME_PATH):
+        if p.relative_to(_HOME_PATH).parts[0] in HOME_DOTFILES:
             return {"zone": "home_dot", "auto_ok": False}
     return {"zone": "unknown", "auto_ok": False}
 
+DEST_EXISTS_TTL_S = 1.0
+_DEST_EXISTS_CACHE: Dict[str, Tuple[float, bool]] = {}
+
 def _dest_exists(path):
+    # Short TTL: repeated rule checks on one command share a stat, but later commands see fresh results.
+    now = time.monotonic()
+    hit = _DEST_EXISTS_CACHE.get(path)
+    if hit and now - hit[0] < DEST_EXISTS_TTL_S:
+        return hit[1]
     try:
-        return os.path.exists(_norm(path))
+        exists = os.path.exists(_norm(path))
     except Exception:
-        return False
+        exists = False
+    if len(_DEST_EXISTS_CACHE) > 256:
+        _DEST_EXISTS_CACHE.clear()
+    _DEST_EXISTS_CACHE[path] = (now, exists)
+    return exists
 
 def _tee_dest(tokens):
     dest = None
@@ -358,38 +536,73 @@ def _tee_dest(tokens):
             break
     return dest
 
-def needs_overwrite_confirmation(cmd: str):
+CMD_SEPARATORS = {"&&", "||", ";", "|", "&", "|&"}
+REDIRECT_OPS = {">", ">>", ">|", "&>", "&>>"}
+
+@lru_cache(maxsize=512)
+def parse_command(cmd: str) -> Tuple[Dict[str, Any], ...]:
+    """Tokenize a shell line once into its list/pipeline segments.
+
+    Each segment is {"argv": (...), "redirects": (...)}; results are cached per command string
+    (treat them as read-only) so repeated checks on the same command share one shlex pass.
+    """
+    lex = shlex.shlex(cmd, posix=True, punctuation_chars=True)
+    lex.whitespace_split = True
     try:
-        tokens = shlex.split(cmd)
-    except Exception:
+        tokens = list(lex)
+    except ValueError:
         tokens = cmd.split()
+    segments = []
+    argv: List[str] = []
+    redirects: List[str] = []
+    it = iter(tokens)
+    for t in it:
+        if t in CMD_SEPARATORS:
+            if argv or redirects:
+                segments.append({"argv": tuple(argv), "redirects": tuple(redirects)})
+            argv, redirects = [], []
+        elif t in REDIRECT_OPS:
+            dest = next(it, None)
+            if dest:
+                redirects.append(dest)
+        else:
+            argv.append(t)
+    if argv or redirects:
+        segments.append({"argv": tuple(argv), "redirects": tuple(redirects)})
+    return tuple(segments)
+
+def _overwrite_dest(seg: Dict[str, Any]) -> Optional[str]:
+    tokens = list(seg["argv"])
+    if tokens[:1] == ["sudo"]:
+        tokens = tokens[1:]
     if tokens and tokens[0] in {"cp", "mv"}:
         if "-t" in tokens:
-            try:
-                dest = tokens[tokens.index("-t") + 1]
-            except Exception:
-                dest = None
+            i = tokens.index("-t") + 1
+            dest = tokens[i] if i < len(tokens) else None
         else:
             dest = tokens[-1] if len(tokens) > 1 else None
         if dest and _dest_exists(dest):
-            cls = classify_overwrite_target(dest)
-            return (not cls["auto_ok"], dest, cls)
+            return dest
     if "tee" in tokens and "-a" not in tokens:
         dest = _tee_dest(tokens)
         if dest and _dest_exists(dest):
+            return dest
+    for dest in seg["redirects"]:
+        if not dest.startswith("/dev/") and _dest_exists(dest):
+            return dest
+    return None
+
+RISKY_MARKERS = ("cp ", "mv ", "tee", ">")
+
+def needs_overwrite_confirmation(cmd: str):
+    # Cheap gate before tokenizing: only cp/mv, tee, or a redirect can overwrite anything.
+    if not any(mk in cmd for mk in RISKY_MARKERS):
+        return (False, None, None)
+    for seg in parse_command(cmd):
+        dest = _overwrite_dest(seg)
+        if dest:
             cls = classify_overwrite_target(dest)
             return (not cls["auto_ok"], dest, cls)
-    if ">" in cmd:
-        try:
-            after = cmd.rsplit(">", 1)[1].strip().lstrip(">")
-            redir_tokens = shlex.split(after)
-            if redir_tokens:
-                dest = redir_tokens[0]
-                if _dest_exists(dest):
-                    cls = classify_overwrite_target(dest)
-                    return (not cls["auto_ok"], dest, cls)
-        except Exception:
-            pass
     return (False, None, None)
 
 # ===== Runners =====
@@ -422,19 +635,48 @@ def preprocess_command(cmd: str):
         return sudo_prefix + core
     return trimmed
 
+# One alternation scanned once per chunk; the named group that matched is the action.
+# "Y/n" (default yes) is case-sensitive so it does not swallow y/N or y/n prompts.
+PROMPTS_RE = re.compile(
+    r"(?P<AUTO_Y>(?i:Do you want to continue\?.*Y/n)|Y/n)"
+    r"|(?P<ENTER>(?i:Press (?:Enter|RETURN) to continue))"
+    r"|(?P<OVERWRITE>(?i:Overwrite .*\?\s*y/N))"
+    r"|(?P<ASK>(?i:\by/n\b))"
+)
+PROMPT_TAIL_CHARS = 256
+OVERWRITE_PATH_RE = re.compile(r"(?i)Overwrite\s+(.+?)\s*\?\s*y/N")
+assert PROMPTS_RE.search("Do you want to continue? [Y/n]").lastgroup == "AUTO_Y", "PROMPTS_RE regressed"
+assert OVERWRITE_PATH_RE.search("Overwrite /tmp/a? y/N").group(1) == "/tmp/a", "OVERWRITE_PATH_RE regressed"
+
+def _scan_prompt(prompt_tail: str, chunk: str):
+    """Search the previous read's tail plus this chunk; returns (match, window, next_tail)."""
+    window = prompt_tail + chunk
+    pm = PROMPTS_RE.search(window)
+    return pm, window, ("" if pm else window[-PROMPT_TAIL_CHARS:])
+
+# ANSI-wrapped prompts are encoded once and written straight to the byte stream.
+ASK_PROMPT_B = b"\033[93mMartin: %s (y/n)\033[0m "
+CMD_CONFIRM_PROMPT_B = b"\033[93mMartin: Command asks confirmation. Approve? (y/n)\033[0m "
+SUMMARY_HEAD_B = b"\n\033[92mMartin (summary):\n- "
+SUMMARY_TAIL_B = b"\033[0m\n\n"
+
+def _write_out(data: bytes) -> None:
+    out = getattr(sys.stdout, "buffer", None)
+    sys.stdout.flush()
+    if out is None:
+        sys.stdout.write(data.decode("utf-8", "ignore"))
+    else:
+        out.write(data)
+    sys.stdout.flush()
+
 def run_command_interactive(command_str):
-    READ_CHUNK = 1024
+    READ_CHUNK = 65536
     PROMPT_TIMEOUT_S = 900
-    PROMPT_RULES = [
-        (re.compile(r"('i)Do you want to continue\'.*Y/n"), "AUTO_Y"),
-        (re.compile(r"('i)Y/n"), "AUTO_Y"),
-        (re.compile(r"('i)Press (Enter|RETURN) to continue"), "ENTER"),
-        (re.compile(r"('i)Overwrite .* \'\s*y/N"), "OVERWRITE"),
-        (re.compile(r"('i)y/n"), "ASK"),
-    ]
-    import pty, os as _os
-    transcript = []
-    since_last_summary = []
+    SELECT_TICK_S = 0.5
+    import pty, selectors, os as _os
+    transcript = bytearray()
+    since_last_summary = bytearray()
+    prompt_tail = ""
     last_summary_ts = time.time()
     auto_answers = 0
     start = time.time()
@@ -445,61 +687,72 @@ def run_command_interactive(command_str):
         except Exception:
             _os._exit(127)
     bytes_bar = tqdm(total=0, desc="Interactive", unit="B", leave=False)
+    sel = selectors.DefaultSelector()
+    sel.register(master_fd, selectors.EVENT_READ)
+    # Reuse one read buffer; readv fills it in place instead of allocating a new bytes per read.
+    read_buf = bytearray(READ_CHUNK)
+    read_view = memoryview(read_buf)
+    has_readv = hasattr(_os, "readv")
     try:
         while True:
             if time.time() - start > PROMPT_TIMEOUT_S:
-                transcript.append("\n[Timeout]\n")
+                transcript.extend(b"\n[Timeout]\n")
                 try:
                     _os.kill(pid, 9)
                 except Exception:
                     pass
                 _os.close(master_fd)
                 bytes_bar.close()
-                return False, "".join(transcript)
+                return False, transcript.decode("utf-8", "ignore")
             try:
-                chunk_b = _os.read(master_fd, READ_CHUNK)
-                if not chunk_b:
-                    break
-                chunk = chunk_b.decode(errors="ignore")
-                transcript.append(chunk)
-                since_last_summary.append(chunk)
-                bytes_bar.update(len(chunk_b))
-                if ECHO_INTERACTIVE:
-                    print(chunk, end="", flush=True)
-                for regex, action in PROMPT_RULES:
-                    if regex.search(chunk):
+                # Wake on output or on a short tick so timeouts and heartbeats run during silence.
+                if sel.select(timeout=SELECT_TICK_S):
+                    if has_readv:
+                        chunk_b = read_view[:_os.readv(master_fd, [read_buf])]
+                    else:
+                        chunk_b = _os.read(master_fd, READ_CHUNK)
+                    if not chunk_b:
+                        break
+                    chunk = str(chunk_b, "utf-8", "ignore")
+                    transcript.extend(chunk_b)
+                    since_last_summary.extend(chunk_b)
+                    bytes_bar.update(len(chunk_b))
+                    if ECHO_INTERACTIVE:
+                        print(chunk, end="", flush=True)
+                    # Keep a short tail from the previous read so prompts split across reads still match.
+                    pm, window, prompt_tail = _scan_prompt(prompt_tail, chunk)
+                    if pm:
+                        action = pm.lastgroup
                         if action == "AUTO_Y":
                             _os.write(master_fd, b"y\n"); auto_answers += 1
                         elif action == "ENTER":
                             _os.write(master_fd, b"\n"); auto_answers += 1
                         elif action == "OVERWRITE":
-                            m = re.search(r"Overwrite\s+(.+')\s+\'\s*y/N", chunk, re.IGNORECASE)
+                            m = OVERWRITE_PATH_RE.search(window)
                             path = (m.group(1).strip() if m else "")
                             _os.write(master_fd, (b"y\n" if classify_overwrite_target(path)["auto_ok"] else b"n\n")); auto_answers += 1
                         elif action == "ASK":
-                            print("\033[93mMartin: Command asks confirmation. Approve' (y/n)\033[0m", end=" ")
+                            _write_out(CMD_CONFIRM_PROMPT_B)
                             try:
                                 ans = input().strip().lower()
                             except (EOFError, KeyboardInterrupt):
                                 ans = "n"
                             _os.write(master_fd, (b"y\n" if ans == "y" else b"n\n")); auto_answers += 1
                         if auto_answers >= 10:
-                            transcript.append("\n[Auto-answer limit reached]\n")
+                            transcript.extend(b"\n[Auto-answer limit reached]\n")
                             break
-                if auto_answers >= 10:
-                    break
                 now = time.time()
                 if (now - last_summary_ts) >= HEARTBEAT_SUMMARY_EVERY_S:
-                    delta = "".join(since_last_summary)
-                    if len(delta) >= HEARTBEAT_MIN_CHARS:
-                        summary = summarize_progress(delta)
+                    if len(since_last_summary) >= HEARTBEAT_MIN_CHARS:
+                        summary = summarize_progress(since_last_summary.decode("utf-8", "ignore"))
                         if summary:
-                            print(f"\n\033[92mMartin (summary):\n- " + summary.replace('\n', '\n- ') + "\033[0m\n")
-                    since_last_summary = []
+                            _write_out(SUMMARY_HEAD_B + summary.replace("\n", "\n- ").encode("utf-8") + SUMMARY_TAIL_B)
+                    since_last_summary.clear()
                     last_summary_ts = now
             except OSError:
                 break
     finally:
+        sel.close()
         try:
             _os.close(master_fd)
         except Exception:
@@ -507,24 +760,34 @@ def run_command_interactive(command_str):
         bytes_bar.close()
     _, status = os.waitpid(pid, 0)
     success = os.WIFEXITED(status) and os.WEXITSTATUS(status) == 0
-    return success, "".join(transcript)
+    return success, transcript.decode("utf-8", "ignore")
+
+SHELL_META_RE = re.compile(r"[|&;<>()$`\\\"'*?~#\[\]{}\n]")
+SHELL_BUILTINS = {"cd", "export", "source", ".", "alias", "unset", "set", "umask", "ulimit", "exec", "exit"}
+
+def _direct_argv(command_str: str) -> Optional[List[str]]:
+    # Plain "prog arg arg" commands skip /bin/sh; subprocess can then spawn via posix_spawn.
+    if SHELL_META_RE.search(command_str):
+        return None
+    argv = command_str.split()
+    if not argv or "=" in argv[0] or argv[0] in SHELL_BUILTINS:
+        return None
+    return argv
 
 def run_command(command_str):
     try:
         if 'nano' in command_str or 'raspi-config' in command_str:
             os.system(f'lxterminal -e "{command_str}"')
             return True, ""
-        process = Popen(command_str, shell=True, stdout=PIPE, stderr=PIPE)
-        stdout, stderr = process.communicate(timeout=CMD_TIMEOUT_S)
+        argv = _direct_argv(command_str)
+        process = subprocess.run(argv or command_str, shell=argv is None, capture_output=True,
+                                 timeout=CMD_TIMEOUT_S, close_fds=False)
+        stdout, stderr = process.stdout, process.stderr
         if process.returncode == 0:
             return True, stdout.decode(errors="ignore").strip() if stdout else ""
         else:
             return False, stderr.decode(errors="ignore").strip() if stderr else f"Return code {process.returncode}"
     except subprocess.TimeoutExpired:
-        try:
-            process.kill()
-        except Exception:
-            pass
         return False, f"Command timed out after {CMD_TIMEOUT_S}s"
     except Exception as e:
         return False, str(e)
@@ -538,18 +801,47 @@ def run_command_smart(command_str):
     else:
         return run_command(cmd)
 
+# Fix commands run side by side only when each is a single captured, non-interactive step.
+FIX_POOL_WORKERS = 4
+SERIAL_FIX_TOOLS = {"pip", "pip3", "npm", "git", "make"}  # share an environment or working tree
+
+def _fix_is_independent(command_str: str) -> bool:
+    cmd = preprocess_command(command_str)
+    if cmd.startswith("cd ") or any(tok in cmd for tok in ("&&", "||", ";", ">", "tee ")):
+        return False
+    if needs_overwrite_confirmation(cmd)[0] or any(h in f" {cmd} " for h in LIKELY_INTERACTIVE_HINTS):
+        return False
+    words = cmd.split()
+    if words[:1] == ["sudo"]:
+        words = words[1:]
+    return bool(words) and words[0] not in SERIAL_FIX_TOOLS
+
+def run_fix_commands(commands: List[str]) -> List[Tuple[str, Tuple[bool, str]]]:
+    if len(commands) > 1 and all(_fix_is_independent(c) for c in commands):
+        for c in commands:
+            print(f"Executing (fix): {c}")
+        with ThreadPoolExecutor(max_workers=FIX_POOL_WORKERS, thread_name_prefix="martin-fix") as pool:
+            return list(zip(commands, pool.map(run_command_smart, commands)))
+    results = []
+    for c in commands:
+        print(f"Executing (fix): {c}")
+        results.append((c, run_command_smart(c)))
+    return results
+
 # ===== Workspace helpers (dev flow) =====
 
 WORKSPACE_DIR = ROOT_DIR / "workspace"
-DEV_CREATE_PAT = re.compile(r"('i)\b(new|make|create)\s+(':a\s+)'(':python\s+)'(':script|file|module)\s+(':called\s+)'([A-Za-z_][A-Za-z0-9_]*)")
-DEV_APPEND_PAT = re.compile(r"('i)\b(add|append)\s+(':a\s+)'(':python\s+)'(':function|code)\s+(':named\s+)'([A-Za-z_][A-Za-z0-9_]*)\s+(':to|into)\s+([A-Za-z0-9_./-]+)")
+DEV_CREATE_PAT = re.compile(r"(?i)\b(new|make|create)\s+(?:a\s+)?(?:python\s+)?(?:script|file|module)\s+(?:called\s+)?([A-Za-z_][A-Za-z0-9_]*)")
+DEV_APPEND_PAT = re.compile(r"(?i)\b(add|append)\s+(?:a\s+)?(?:python\s+)?(?:function|code)\s+(?:named\s+)?([A-Za-z_][A-Za-z0-9_]*)\s+(?:to|into)\s+([A-Za-z0-9_./-]+)")
+assert DEV_CREATE_PAT.search("create a python script called demo").group(2) == "demo", "DEV_CREATE_PAT regressed"
+assert DEV_APPEND_PAT.search("add a function named f to demo.py").group(3) == "demo.py", "DEV_APPEND_PAT regressed"
 
 def _ensure_workspace(st: Dict[str, Any]) -> Path:
     ws_path = Path(st.get("workspace", {}).get("path") or "./workspace")
     ws_path = (ROOT_DIR / ws_path).resolve()
     ws_path.mkdir(parents=True, exist_ok=True)
     st["workspace"]["path"] = str(os.path.relpath(ws_path, ROOT_DIR))
-    save_state(st)
+    mark_state_dirty(st)
     return ws_path
 
 def _write_text_atomic(path: Path, text: str) -> None:
@@ -560,7 +852,8 @@ def _write_text_atomic(path: Path, text: str) -> None:
 
 def _ask_yes_no(prompt: str, default_no=True) -> bool:
     try:
-        ans = input(f"\033[93mMartin: {prompt} (y/n)\033[0m ").strip().lower()
+        _write_out(ASK_PROMPT_B % prompt.encode("utf-8"))
+        ans = input().strip().lower()
     except (EOFError, KeyboardInterrupt):
         ans = "n" if default_no else "y"
     return ans == "y"
@@ -588,7 +881,7 @@ def _generate_python_content(user_input: str, existing_path: Optional[Path] = No
     return resp or ""
 
 def dev_flow(user_input: str) -> bool:
-    st = load_state()
+    st = get_state()
     log_event(st, "flow_start", flow="dev", input_len=len(user_input or ""))
     ws = _ensure_workspace(st)
 
@@ -597,7 +890,7 @@ def dev_flow(user_input: str) -> bool:
         script_name = m_create.group(2)
         target = (ws / f"{script_name}.py").resolve()
         if target.exists():
-            if not _ask_yes_no(f"{target.name} exists. Append to it'"):
+            if not _ask_yes_no(f"{target.name} exists. Append to it?"):
                 print("\033[93mMartin: Skipped (file exists).\033[0m")
                 log_event(st, "dev_skipped_exists", path=str(target))
                 log_event(st, "flow_end", flow="dev", status="skipped")
@@ -611,7 +904,7 @@ def dev_flow(user_input: str) -> bool:
             with open(target, "a", encoding="utf-8") as f:
                 f.write("\n\n" + generated + "\n")
             st["workspace"]["last_file"] = str(os.path.relpath(target, ROOT_DIR))
-            save_state(st)
+            mark_state_dirty(st)
             print(f"\033[92mMartin: Appended code to {target}\033[0m")
             log_event(st, "dev_append_code", path=str(target), append_len=len(generated))
             log_event(st, "flow_end", flow="dev", status="ok")
@@ -625,7 +918,7 @@ def dev_flow(user_input: str) -> bool:
                 return True
             _write_text_atomic(target, generated + ("\n" if not generated.endswith("\n") else ""))
             st["workspace"]["last_file"] = str(os.path.relpath(target, ROOT_DIR))
-            save_state(st)
+            mark_state_dirty(st)
             print(f"\033[92mMartin: Created {target}\033[0m")
             log_event(st, "dev_create_file", path=str(target), size=len(generated))
             log_event(st, "flow_end", flow="dev", status="ok")
@@ -640,7 +933,7 @@ def dev_flow(user_input: str) -> bool:
             target = target.with_suffix(".py")
         target.parent.mkdir(parents=True, exist_ok=True)
         if not target.exists():
-            if not _ask_yes_no(f"{target.name} does not exist. Create it'"):
+            if not _ask_yes_no(f"{target.name} does not exist. Create it?"):
                 print("\033[93mMartin: Aborted (no file).\033[0m")
                 log_event(st, "dev_skipped_missing", path=str(target))
                 log_event(st, "flow_end", flow="dev", status="skipped")
@@ -654,19 +947,19 @@ def dev_flow(user_input: str) -> bool:
         with open(target, "a", encoding="utf-8") as f:
             f.write("\n\n" + generated + "\n")
         st["workspace"]["last_file"] = str(os.path.relpath(target, ROOT_DIR))
-        save_state(st)
+        mark_state_dirty(st)
         print(f"\033[92mMartin: Appended code to {target}\033[0m")
         log_event(st, "dev_append_code", path=str(target), append_len=len(generated))
         log_event(st, "flow_end", flow="dev", status="ok")
         return True
 
-    safe_name = "script_" + datetime.datetime.utcnow().strftime("%Y%m%d_%H%M%S")
+    safe_name = "script_" + time.strftime("%Y%m%d_%H%M%S", time.gmtime())
     target = (ws / f"{safe_name}.py").resolve()
     generated = _generate_python_content(user_input, existing_path=None, filename_hint=safe_name)
     if generated.strip():
         _write_text_atomic(target, generated + ("\n" if not generated.endswith("\n") else ""))
         st["workspace"]["last_file"] = str(os.path.relpath(target, ROOT_DIR))
-        save_state(st)
+        mark_state_dirty(st)
         print(f"\033[92mMartin: Created {target}\033[0m")
         log_event(st, "dev_create_file", path=str(target), size=len(generated), fallback=True)
         log_event(st, "flow_end", flow="dev", status="ok")
@@ -679,38 +972,113 @@ def dev_flow(user_input: str) -> bool:
 
 # ===== Chef & Waiter =====
 
+@lru_cache(maxsize=128)
+def _which(bin_name: str, path_env: str) -> Optional[str]:
+    # Keyed on PATH so a changed PATH is a cache miss; martin.rehash clears it outright.
+    return shutil.which(bin_name, path=path_env)
+
 def system_snapshot() -> Dict[str, Any]:
-    st = load_state()
+    st = get_state()
     ws = (ROOT_DIR / (st.get("workspace", {}).get("path") or "workspace")).resolve()
     ws.mkdir(parents=True, exist_ok=True)
     bins = ["python3", "pip3", "git", "node", "npm", "java", "javac", "make"]
-    path_map = {b: shutil.which(b) for b in bins}
+    path_env = os.environ.get("PATH", os.defpath)
+    path_map = {b: _which(b, path_env) for b in bins}
     return {"platform": st.get("platform", {}), "workspace": str(ws),
             "binaries": path_map, "has_api_key": bool(API_KEY), "username": current_username}
 
+# Small LRU caches for the structuring calls: Chef keyed on normalized input, Waiter on its full prompt.
+RESPONSE_CACHE_MAX = 512
+_CHEF_CACHE: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_WAITER_CACHE: "OrderedDict[bytes, str]" = OrderedDict()
+
+def _cache_get(cache: OrderedDict, key: Any) -> Any:
+    val = cache.get(key)
+    if val is not None:
+        cache.move_to_end(key)
+    return val
+
+def _cache_put(cache: OrderedDict, key: Any, val: Any) -> None:
+    cache[key] = val
+    cache.move_to_end(key)
+    while len(cache) > RESPONSE_CACHE_MAX:
+        cache.popitem(last=False)
+
+# Static prompt text is kept in module constants and placed ahead of per-turn content, so
+# consecutive requests share an identical prefix for server-side prompt caching.
+CHEF_SYS = "Convert unstructured input into a concise intent + JSON. Also summarize each sentence that contains a question mark."
+CHEF_INSTRUCTIONS = (
+    "Return ONLY compact JSON with fields: "
+    "{intent_one_liner, question_summaries, implied_actions, persona, confidence, wants_build, summary}. "
+    "intent_one_liner: max 20 words.\n"
+    "question_summaries: array; for each sentence containing '?', add a 1-line summary.\n"
+    "implied_actions: short verbs (plan, list, build, check...).\n"
+    "persona: one of [plan, build, diagnose, general] (hint only).\n"
+    "confidence: 0.0-1.0.\n"
+    "wants_build: boolean guess if they want actual system actions now.\n"
+    "summary: brief 1-2 sentence paraphrase.\n\n"
+)
+WAITER_SYS = (
+    "You are the WAITER layer. Produce only:\n"
+    "1) 'GUIDANCE:' line (tone/intensity; succinct directive for Main)\n"
+    "2) 'BEHAVIOR:' one of {chat, plan, build, run, diagnose}\n"
+    "3) 'QUESTIONS:' line, then one bullet per '?' sentence (or 'none')\n"
+    "Do NOT output shell commands. Do NOT prune the abilities - present the full inventory as-is."
+)
+WAITER_INSTRUCTIONS = (
+    "Prepare guidance + behavior classification + question summaries from the context below.\n"
+    "Constraints:\n"
+    "- First line MUST be a single 'GUIDANCE:' line (max ~20 words).\n"
+    "- Then exactly one 'BEHAVIOR:' line with one of {chat, plan, build, run, diagnose}.\n"
+    "- Then 'QUESTIONS:' on a single line, followed by one bullet per question sentence (if none, say 'none').\n"
+    "- Do NOT output any shell commands.\n\n"
+)
+MAIN_SYS = (
+    "You are Martin - butler-class, terse, competent.\n"
+    "Observe. Execute. Report.\n"
+    "Follow the WAITER guidance and context. Be decisive but safe."
+)
+MAIN_INSTRUCTIONS = (
+    "Internal invocation protocol: command: martin.<ability_key> <payload>\n"
+    "Produce the final plan from the context below. If behavior = chat/plan, you may choose to output no commands. "
+    "If behavior = build/run/diagnose, output precise steps ONLY if truly warranted.\n\n"
+)
+
+# Inputs that need no LLM structuring: greetings, slash commands, and very short messages.
+TRIVIAL_INPUT_RE = re.compile(r"(?i)^\s*(?:/\w+|quit|exit|help|hi|hello|hey|thanks?|thank you|ok(?:ay)?)\s*[.!]*\s*$")
+TRIVIAL_MAX_WORDS = 3
+
+def _trivial_chef(user_input: str) -> Optional[Dict[str, Any]]:
+    text = user_input.strip()
+    if not (TRIVIAL_INPUT_RE.match(text) or len(text.split()) <= TRIVIAL_MAX_WORDS):
+        return None
+    return {
+        "intent_one_liner": text[:140] or "General conversation",
+        "question_summaries": [text] if "?" in text else [],
+        "implied_actions": [],
+        "persona": "general",
+        "confidence": 0.5,
+        "wants_build": False,
+        "summary": text[:140],
+    }
+
 def chef_structured_intent(user_input: str) -> Dict[str, Any]:
+    trivial = _trivial_chef(user_input)
+    if trivial is not None:
+        return trivial
+    cache_key = " ".join(user_input.lower().split())
+    cached = _cache_get(_CHEF_CACHE, cache_key)
+    if cached is not None:
+        return dict(cached)
     bar = tqdm(total=1, desc="Chef", unit="step") if SHOW_TURN_BAR else None
-    sys_msg = "Convert unstructured input into a concise intent + JSON. Also summarize each sentence that contains a question mark."
-    usr = (
-        "Return ONLY compact JSON with fields: "
-        "{intent_one_liner, question_summaries, implied_actions, persona, confidence, wants_build, summary}. "
-        "intent_one_liner: max 20 words.\n"
-        "question_summaries: array; for each sentence containing ''', add a 1-line summary.\n"
-        "implied_actions: short verbs (plan, list, build, check...).\n"
-        "persona: one of [plan, build, diagnose, general] (hint only).\n"
-        "confidence: 0.0-1.0.\n"
-        "wants_build: boolean guess if they want actual system actions now.\n"
-        "summary: brief 1-2 sentence paraphrase.\n\n"
-        f"User said:\n{user_input}"
-    )
     payload = {
         "model": MODEL_MINI,
         "input": [
-            {"role": "system", "content": sys_msg},
-            {"role": "user", "content": usr},
+            {"role": "system", "content": CHEF_SYS},
+            {"role": "user", "content": f"{CHEF_INSTRUCTIONS}User said:\n{user_input}"},
         ],
         "temperature": 0.2,
-        "max_output_tokens": 300,
+        "max_output_tokens": 150,
     }
     resp = _post_responses(payload, label="Chef")
     if bar:
@@ -718,7 +1086,7 @@ def chef_structured_intent(user_input: str) -> Dict[str, Any]:
         bar.close()
     txt = _extract_output_text(resp) or "{}"
     try:
-        data = json.loads(txt)
+        data = _json_loads(txt)
         if not isinstance(data, dict):
             raise ValueError("not dict")
         data.setdefault("question_summaries", [])
@@ -727,6 +1095,8 @@ def chef_structured_intent(user_input: str) -> Dict[str, Any]:
         data.setdefault("confidence", 0.5)
         data.setdefault("wants_build", False)
         data.setdefault("summary", data.get("intent_one_liner", "") or user_input[:140])
+        if not resp.get("error"):
+            _cache_put(_CHEF_CACHE, cache_key, dict(data))
         return data
     except Exception:
         return {
@@ -739,32 +1109,24 @@ def chef_structured_intent(user_input: str) -> Dict[str, Any]:
             "summary": user_input[:140],
         }
 
+# Capability markers are comment lines: "# CAPABILITY: key - description".
+CAPABILITY_RE = re.compile(rb"(?m)^[ \t]*#[ \t]*CAPABILITY:[ \t]*([^\r\n-]+)-?([^\r\n]*)")
+
+@lru_cache(maxsize=1)
 def enumerate_capabilities() -> List[Dict[str, str]]:
-    caps: List[Dict[str, str]] = []
-    try:
-        src = Path(__file__).read_text(encoding="utf-8", errors="ignore")
-    except Exception:
-        return caps
-    for line in src.splitlines():
-        if "CAPABILITY:" in line:
-            try:
-                frag = line.split("CAPABILITY:", 1)[1].strip()
-                if "-" in frag:
-                    key, desc = frag.split("-", 1)
-                elif "-" in frag:
-                    key, desc = frag.split("-", 1)
-                else:
-                    key, desc = frag, ""
-                caps.append({"key": key.strip().strip(":"), "description": desc.strip()})
-            except Exception:
-                continue
+    # The source does not change at runtime, so scan it once; callers treat the list as read-only.
+    out: List[Dict[str, str]] = []
     seen = set()
-    out = []
-    for c in caps:
-        if c["key"] in seen:
-            continue
-        seen.add(c["key"])
-        out.append(c)
+    try:
+        with open(__file__, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for m in CAPABILITY_RE.finditer(mm):
+                key = m.group(1).strip().strip(b":").decode("utf-8", "ignore")
+                if not key or key in seen:
+                    continue
+                seen.add(key)
+                out.append({"key": key, "description": m.group(2).strip().decode("utf-8", "ignore")})
+    except (OSError, ValueError):
+        pass
     return out
 
 ABILITY_REGISTRY: Dict[str, Any] = {}
@@ -775,7 +1137,8 @@ def _ability_register():
     ABILITY_REGISTRY["shell.run"] = lambda payload: run_command_smart(payload)
     ABILITY_REGISTRY["shell.install"] = lambda payload: run_command_smart(payload)
     ABILITY_REGISTRY["diagnose"] = lambda payload: (True, diagnose_failure("(no command)", payload))
-    ABILITY_REGISTRY["env.check"] = lambda payload: (True, json.dumps(system_snapshot(), ensure_ascii=False, indent=2))
+    ABILITY_REGISTRY["env.check"] = lambda payload: (True, _json_text(system_snapshot(), indent=True))
+    ABILITY_REGISTRY["rehash"] = lambda payload: (_which.cache_clear() or True, "(binary lookup cache cleared)")
 
 _ability_register()
 
@@ -791,21 +1154,20 @@ def dispatch_internal_ability(key: str, payload: str) -> Tuple[bool, str]:
     except Exception as e:
         return (False, f"(internal error) {e}")
 
-def waiter_prepare_request(chef_out: Dict[str, Any]) -> Dict[str, Any]:
+# Waiter reply sections: one GUIDANCE line, one BEHAVIOR line, then bullets after QUESTIONS.
+WAITER_GUIDANCE_RE = re.compile(r"(?im)^[ \t]*GUIDANCE:.*$")
+WAITER_BEHAVIOR_RE = re.compile(r"(?im)^[ \t]*BEHAVIOR:[ \t]*(\w+)")
+WAITER_QUESTIONS_RE = re.compile(r"(?im)^[ \t]*QUESTIONS:.*$")
+WAITER_BULLET_RE = re.compile("(?m)^[ \t]*[-*\u2022\u2014][ \t]*(.+?)[ \t]*$")  # -, *, bullet, em dash
+
+def waiter_prepare_request(chef_out: Dict[str, Any], snap: Optional[Dict[str, Any]] = None,
+                           inv: Optional[List[Dict[str, str]]] = None) -> Dict[str, Any]:
     bar = tqdm(total=1, desc="Waiter", unit="step") if SHOW_TURN_BAR else None
-    snap = system_snapshot()
-    inv = enumerate_capabilities()
-
-    sys_directive = (
-        "You are the WAITER layer. Produce only:\n"
-        "1) 'GUIDANCE:' line (tone/intensity; succinct directive for Main)\n"
-        "2) 'BEHAVIOR:' one of {chat, plan, build, run, diagnose}\n"
-        "3) 'QUESTIONS:' line, then one bullet per ''' sentence (or 'none')\n"
-        "Do NOT output shell commands. Do NOT prune the abilities - present the full inventory as-is."
-    )
+    snap = snap if snap is not None else system_snapshot()
+    inv = inv if inv is not None else enumerate_capabilities()
+
+    # Most stable fields first, Chef's per-turn intent last.
     user_context = {
-        "chef_intent": chef_out,
-        "environment_snapshot": snap,
         "capability_inventory": inv,
         "internal_invocation_protocol": "To invoke any listed ability, emit: command: martin.<ability_key> <payload>",
         "guardrails": {
@@ -813,46 +1175,39 @@ def waiter_prepare_request(chef_out: Dict[str, Any]) -> Dict[str, Any]:
             "no_cli_for_pure_chat": True,
         },
         "workspace_rules": {
-            "path": load_state().get("workspace", {}).get("path", "./workspace"),
+            "path": get_state().get("workspace", {}).get("path", "./workspace"),
             "atomic_writes": True,
             "append_only_for_existing": True,
         },
+        "environment_snapshot": snap,
+        "chef_intent": chef_out,
     }
-    waiter_prompt = (
-        "Prepare guidance + behavior classification + question summaries given:\n"
-        f"{json.dumps(user_context, ensure_ascii=False, indent=2)}\n\n"
-        "Constraints:\n"
-        "- First line MUST be a single 'GUIDANCE:' line (max ~20 words).\n"
-        "- Then exactly one 'BEHAVIOR:' line with one of {chat, plan, build, run, diagnose}.\n"
-        "- Then 'QUESTIONS:' on a single line, followed by one bullet per question sentence (if none, say 'none').\n"
-        "- Do NOT output any shell commands."
-    )
+    waiter_prompt = f"{WAITER_INSTRUCTIONS}{_json_text(user_context)}"
     payload = {
         "model": MODEL_MINI,
         "input": [
-            {"role": "system", "content": sys_directive},
+            {"role": "system", "content": WAITER_SYS},
             {"role": "user", "content": waiter_prompt},
         ],
         "temperature": 0.3,
         "max_output_tokens": 700,
     }
-    resp = _post_responses(payload, label="Waiter")
+    cache_key = hashlib.blake2b(waiter_prompt.encode("utf-8"), digest_size=16).digest()
+    txt = _cache_get(_WAITER_CACHE, cache_key)
+    if txt is None:
+        resp = _post_responses(payload, label="Waiter")
+        txt = _extract_output_text(resp) or ""
+        if txt:
+            _cache_put(_WAITER_CACHE, cache_key, txt)
     if bar:
         bar.update(1)
         bar.close()
-    txt = _extract_output_text(resp) or ""
-    guidance, behavior, questions = "", "chat", []
-    parsing_questions = False
-    for ln in txt.splitlines():
-        up = ln.strip().upper()
-        if up.startswith("GUIDANCE:"):
-            guidance = ln.strip()
-        elif up.startswith("BEHAVIOR:"):
-            behavior = ln.split(":", 1)[1].strip().lower() or "chat"
-        elif up.startswith("QUESTIONS:"):
-            parsing_questions = True
-        elif parsing_questions and ln.strip().startswith(("-", "-", "*")):
-            questions.append(ln.strip("--* ").strip())
+    g = WAITER_GUIDANCE_RE.search(txt)
+    guidance = g.group(0).strip() if g else ""
+    b = WAITER_BEHAVIOR_RE.search(txt)
+    behavior = b.group(1).lower() if b else "chat"
+    q = WAITER_QUESTIONS_RE.search(txt)
+    questions = [s.strip() for s in WAITER_BULLET_RE.findall(txt, q.end())] if q else []
     return {
         "inventory": inv,
         "snapshot": snap,
@@ -865,21 +1220,33 @@ def waiter_prepare_request(chef_out: Dict[str, Any]) -> Dict[str, Any]:
 
 # ===== Main loop (Chef -> Waiter -> Main) =====
 
+# Background worker for per-turn work that does not depend on the model calls in flight.
+_TURN_POOL = ThreadPoolExecutor(max_workers=2, thread_name_prefix="martin-turn")
+
+# Main only needs the capability inventory when it may plan system actions.
+ACTION_BEHAVIORS = {"build", "run", "diagnose"}
+
+@lru_cache(maxsize=1)
+def _inventory_json() -> str:
+    return _json_text(enumerate_capabilities())
+
 if __name__ == "__main__":
-    st = load_state()
+    st = get_state()
     sess = SessionCtx(st)
     sess.begin()
 
     print("Martin: Welcome, Sir! Type 'quit' to exit.")
 
     while True:
+        # Turn boundary: persist the previous turn's events in one write before blocking on input.
+        flush_ledger()
         try:
             user_input = input("\033[94mYou:\033[0m ")
         except (EOFError, KeyboardInterrupt):
             print("\033[92mMartin: Farewell, Sir.\033[0m")
             break
 
-        interaction_history.append("You: " + user_input)
+        interaction_history.append(("You", user_input))
         if user_input.lower() == 'quit':
             print("\033[92mMartin: Goodbye, Sir!\033[0m")
             break
@@ -888,46 +1255,65 @@ if __name__ == "__main__":
 
         if turn_bar:
             turn_bar.update(1)
+        # The environment snapshot does not depend on Chef, so take it while Chef is in flight.
+        snap_future = _TURN_POOL.submit(system_snapshot)
         chef_out = chef_structured_intent(user_input)
         log_event(st, "chef_intent", chef=chef_out)
 
-        waiter_pack = waiter_prepare_request(chef_out)
+        snap = snap_future.result()
+        inv = enumerate_capabilities()
+        # Main's context block is fixed once Chef is done; serialize it while Waiter is in flight.
+        main_ctx_future = _TURN_POOL.submit(
+            _json_text, {'snapshot': snap, 'chef': chef_out})
+        waiter_pack = waiter_prepare_request(chef_out, snap=snap, inv=inv)
         log_event(st, "waiter_pack", guidance=waiter_pack.get("guidance_banner", ""), behavior=waiter_pack.get("behavior", "chat"))
 
         if turn_bar:
             turn_bar.update(1)
-        main_sys = (
-            "You are Martin - butler-class, terse, competent.\n"
-            "Observe. Execute. Report.\n"
-            "Follow the WAITER guidance and context. Be decisive but safe."
-        )
         qs = waiter_pack.get('question_summaries') or []
         q_lines = "\n".join(f"- {q}" for q in qs) if qs else "- none"
+        inv_block = ""
+        if waiter_pack.get("behavior") in ACTION_BEHAVIORS:
+            inv_block = f"Capability inventory:\n{_inventory_json()}\n\n"
         main_user = (
+            f"{MAIN_INSTRUCTIONS}"
+            f"{inv_block}"
             "Chef intent + Waiter context:\n"
-            f"{json.dumps({'chef': chef_out, 'capability_inventory': waiter_pack.get('inventory', []), 'snapshot': waiter_pack.get('snapshot', {})}, ensure_ascii=False, indent=2)}\n\n"
+            f"{main_ctx_future.result()}\n\n"
             "Waiter GUIDANCE (authoritative):\n"
             f"{waiter_pack.get('guidance_banner', '')}\n\n"
             "Behavior classification:\n"
             f"{waiter_pack.get('behavior', 'chat')}\n\n"
             "Question summaries (user asked):\n"
-            f"{q_lines}\n\n"
-            "Internal invocation protocol: command: martin.<ability_key> <payload>\n\n"
-            "Now produce the final plan. If behavior = chat/plan, you may choose to output no commands. "
-            "If behavior = build/run/diagnose, output precise steps ONLY if truly warranted."
+            f"{q_lines}"
         )
         payload = {
             "model": MODEL_MAIN,
             "input": [
-                {"role": "system", "content": main_sys},
+                {"role": "system", "content": MAIN_SYS},
                 {"role": "user", "content": main_user},
             ],
             "temperature": 0.4,
             "max_output_tokens": 1200,
         }
-        bot_json = _post_responses(payload, label="Main")
+        streamed: List[str] = []
+
+        def _echo(chunk: str) -> None:
+            # Print Main's reply as it arrives; the plan is still parsed from the full text below.
+            if not streamed:
+                if turn_bar:
+                    turn_bar.clear()
+                sys.stdout.write("\033[92mMartin:\n")
+            streamed.append(chunk)
+            sys.stdout.write(chunk)
+            sys.stdout.flush()
+
+        bot_json = _post_responses(payload, label="Main", on_delta=_echo)
+        if streamed:
+            sys.stdout.write("\033[0m\n")
+            sys.stdout.flush()
         bot_response = _extract_output_text(bot_json) or ""
-        interaction_history.append("Martin: " + bot_response)
+        interaction_history.append(("Martin", bot_response))
 
         if turn_bar:
             turn_bar.update(1)
@@ -937,28 +1323,19 @@ if __name__ == "__main__":
             print("\033[93mMartin: No response received from main call.\033[0m")
             continue
 
-        print(f"\033[92mMartin:\n{bot_response}\033[0m")
-
-        def _parse_internal_cmd(c: str) -> Tuple[Optional[str], Optional[str]]:
-            s = c.strip()
-            if not s.lower().startswith("martin."):
-                return (None, None)
-            body = s[len("martin."):].strip()
-            if " " in body:
-                key, payload = body.split(" ", 1)
-            elif ":" in body:
-                key, payload = body.split(":", 1)
-            else:
-                key, payload = body, ""
-            return (key.strip(), payload.strip())
+        if not streamed:
+            print(f"\033[92mMartin:\n{bot_response}\033[0m")
 
-        terminal_commands = extract_commands(bot_response)
-        if terminal_commands:
+        parsed_plan = reply_plan(bot_json, bot_response)
+        if bot_json.get("incomplete_details"):
+            print("\033[93mMartin: Connection dropped; the reply above is incomplete, so none of its commands will run.\033[0m")
+            continue
+        if parsed_plan:
             print("\n\033[96mMartin: Proposed command plan (review):\033[0m")
-            for i, c in enumerate(terminal_commands, 1):
+            for i, (c, _, _) in enumerate(parsed_plan, 1):
                 print(f"  {i}. {c}")
             try:
-                confirm = input("\033[93mApprove running these commands' (yes/no/abort)\033[0m ").strip().lower()
+                confirm = input("\033[93mApprove running these commands? (yes/no/abort)\033[0m ").strip().lower()
             except (EOFError, KeyboardInterrupt):
                 confirm = "no"
             if confirm == "abort":
@@ -968,25 +1345,21 @@ if __name__ == "__main__":
                 print("\033[92mMartin: Understood - not running commands. I remain at your disposal, Sir.\033[0m")
                 continue
 
-        if not terminal_commands:
+        if not parsed_plan:
             print("\033[93mMartin: No commands extracted from the response.\033[0m")
             continue
 
-        plan = []
-        for i, cmd in enumerate(terminal_commands):
-            raw = cmd.replace("command:", "", 1).strip() if cmd.lower().startswith("command:") else cmd
-            ability_key, payload_txt = _parse_internal_cmd(raw)
-            plan.append({
-                "index": i + 1,
-                "cmd": cmd,
-                "status": "pending",
-                "internal_key": ability_key,
-                "payload": payload_txt,
-                "output": "",
-                "started_at": None,
-                "ended_at": None,
-                "duration_s": 0.0,
-            })
+        plan = [{
+            "index": i,
+            "cmd": cmd,
+            "status": "pending",
+            "internal_key": ability_key,
+            "payload": payload_txt,
+            "output": "",
+            "started_at": None,
+            "ended_at": None,
+            "duration_s": 0.0,
+        } for i, (cmd, ability_key, payload_txt) in enumerate(parsed_plan, 1)]
 
         successes_this_turn = 0
         failures_this_turn = 0
@@ -1020,11 +1393,11 @@ if __name__ == "__main__":
                 diagnosis = diagnose_failure(step["cmd"], output or "")
                 print(f"\033[93mMartin (diagnosis): {diagnosis}\033[0m")
                 try:
-                    rerun_option = input("\033[92mMartin: Apply suggested fix commands now, or abort' (yes/no/abort)\033[0m ").strip().lower()
+                    rerun_option = input("\033[92mMartin: Apply suggested fix commands now, or abort? (yes/no/abort)\033[0m ").strip().lower()
                 except (EOFError, KeyboardInterrupt):
                     rerun_option = "no"
                 if rerun_option == 'yes':
-                    interaction_history.append("Martin (diagnosis): " + diagnosis)
+                    interaction_history.append(("Martin (diagnosis)", diagnosis))
                     new_terminal_commands = extract_commands(diagnosis)
                     if not new_terminal_commands:
                         print("\033[93mMartin: Diagnosis included no runnable commands.\033[0m")
@@ -1033,16 +1406,14 @@ if __name__ == "__main__":
                         for i2, c2 in enumerate(new_terminal_commands, 1):
                             print(f"  {i2}. {c2}")
                         try:
-                            confirm_fix = input("\033[93mApprove running FIX commands' (yes/no/abort)\033[0m ").strip().lower()
+                            confirm_fix = input("\033[93mApprove running FIX commands? (yes/no/abort)\033[0m ").strip().lower()
                         except (EOFError, KeyboardInterrupt):
                             confirm_fix = "no"
                         if confirm_fix == "abort":
                             print("\033[92mMartin: Aborting per request, Sir.\033[0m")
                             break
                         elif confirm_fix == "yes":
-                            for new_command in new_terminal_commands:
-                                print(f"Executing (fix): {new_command}")
-                                s2, out2 = run_command_smart(new_command)
+                            for new_command, (s2, out2) in run_fix_commands(new_terminal_commands):
                                 if s2:
                                     successes_this_turn += 1
                                 else:
@@ -1,115 +1,216 @@
+import heapq
 import os
-import glob
+import time
+from bisect import bisect_left
+from collections import OrderedDict, deque
+from itertools import islice
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from types import MappingProxyType
+from typing import Dict, List, Optional, Sequence, Tuple
+
+SLASH_COMMANDS = (
+    "/help", "/clear", "/status", "/memory", "/history", "/palette", "/files", "/open", "/worklog", "/clock", "/privacy", "/keys", "/retry", "/onboarding", "/context", "/plan", "/outputs", "/resume", "/librarian", "/tasks", "/queue", "/tests", "/rerun",
+    "/abilities", "/resources", "/resource", "/rag",
+    "/agent", "/cloud", "/ask", "/ingest", "/compress", "/signoff", "/exit", "/catalog", "/review", "/host", "/remote", "/redaction", "/import", "/goal", "/verify", "/trust", "/encrypt", "/decrypt", "/rotate",
+)
+
+COMMAND_DESCRIPTIONS = MappingProxyType({
+    "/help": "show commands",
+    "/clear": "clear transcript",
+    "/status": "show status JSON",
+    "/memory": "show memory snapshots",
+    "/history": "show recent inputs",
+    "/palette": "command palette + recent inputs",
+    "/files": "file picker",
+    "/open": "show file snippet at a line",
+    "/worklog": "show recent worklog",
+    "/clock": "clock in/out",
+    "/privacy": "toggle session privacy",
+    "/keys": "show keybindings",
+    "/retry": "retry last failed command",
+    "/onboarding": "run onboarding wizard",
+    "/context": "show context pack",
+    "/plan": "show last plan",
+    "/outputs": "list saved outputs",
+    "/resume": "show resume snapshot",
+    "/librarian": "inbox/request/sources",
+    "/tasks": "task queue",
+    "/queue": "action queue (planner)",
+    "/abilities": "list internal abilities",
+    "/resources": "list readable resources",
+    "/resource": "read a resource",
+    "/tests": "suggest tests",
+    "/rerun": "rerun last command/test",
+    "/rag": "rag status",
+    "/agent": "agent mode toggle",
+    "/cloud": "cloud mode toggle",
+    "/ask": "ask local RAG",
+    "/ingest": "ingest paths",
+    "/compress": "compress transcript",
+    "/signoff": "signoff summary",
+    "/exit": "exit chat",
+    "/catalog": "librarian catalog",
+    "/review": "review mode toggle",
+    "/host": "device registry",
+    "/remote": "remote tunnel",
+    "/redaction": "redaction report",
+    "/import": "import session",
+    "/goal": "active goal",
+    "/verify": "verification checklist",
+    "/trust": "trust policy tools",
+    "/encrypt": "encrypt a file",
+    "/decrypt": "decrypt a file",
+    "/rotate": "rotate encryption key for file",
+})
 
-from researcher.resource_registry import list_resources
 
 def get_slash_commands() -> List[str]:
-    return [
-        "/help", "/clear", "/status", "/memory", "/history", "/palette", "/files", "/open", "/worklog", "/clock", "/privacy", "/keys", "/retry", "/onboarding", "/context", "/plan", "/outputs", "/resume", "/librarian", "/tasks", "/queue", "/tests", "/rerun",
-        "/abilities", "/resources", "/resource", "/rag",
-        "/agent", "/cloud", "/ask", "/ingest", "/compress", "/signoff", "/exit", "/catalog", "/review", "/host", "/remote", "/redaction", "/import", "/goal", "/verify", "/trust", "/encrypt", "/decrypt", "/rotate",
-    ]
+    # Fresh list: the chat loop appends its own entries.
+    return list(SLASH_COMMANDS)
 
 
 def get_command_descriptions() -> Dict[str, str]:
-    return {
-        "/help": "show commands",
-        "/clear": "clear transcript",
-        "/status": "show status JSON",
-        "/memory": "show memory snapshots",
-        "/history": "show recent inputs",
-        "/palette": "command palette + recent inputs",
-        "/files": "file picker",
-        "/open": "show file snippet at a line",
-        "/worklog": "show recent worklog",
-        "/clock": "clock in/out",
-        "/privacy": "toggle session privacy",
-        "/keys": "show keybindings",
-        "/retry": "retry last failed command",
-        "/onboarding": "run onboarding wizard",
-        "/context": "show context pack",
-        "/plan": "show last plan",
-        "/outputs": "list saved outputs",
-        "/resume": "show resume snapshot",
-        "/librarian": "inbox/request/sources",
-        "/tasks": "task queue",
-        "/queue": "action queue (planner)",
-        "/abilities": "list internal abilities",
-        "/resources": "list readable resources",
-        "/resource": "read a resource",
-        "/tests": "suggest tests",
-        "/rerun": "rerun last command/test",
-        "/rag": "rag status",
-        "/agent": "agent mode toggle",
-        "/cloud": "cloud mode toggle",
-        "/ask": "ask local RAG",
-        "/ingest": "ingest paths",
-        "/compress": "compress transcript",
-        "/signoff": "signoff summary",
-        "/exit": "exit chat",
-        "/catalog": "librarian catalog",
-        "/review": "review mode toggle",
-        "/host": "device registry",
-        "/remote": "remote tunnel",
-        "/redaction": "redaction report",
-        "/import": "import session",
-        "/goal": "active goal",
-        "/verify": "verification checklist",
-        "/trust": "trust policy tools",
-        "/encrypt": "encrypt a file",
-        "/decrypt": "decrypt a file",
-        "/rotate": "rotate encryption key for file",
-    }
+    return dict(COMMAND_DESCRIPTIONS)
 
 
 def _fuzzy_match(needle: str, hay: str) -> bool:
+    """Subsequence match; needle is lowercased here, hay is expected to be lowercase already."""
     if not needle:
         return True
-    it = iter(hay)
-    for ch in needle:
-        for h in it:
-            if h == ch:
-                break
-        else:
+    if len(needle) > len(hay):
+        return False
+    pos = 0
+    for ch in needle.lower():
+        i = hay.find(ch, pos)
+        if i < 0:
             return False
+        pos = i + 1
     return True
 
 
+def _prefix_matches(sorted_items: Sequence[str], prefix: str) -> List[str]:
+    """All items starting with prefix, found by bisecting a sorted sequence."""
+    out: List[str] = []
+    i = bisect_left(sorted_items, prefix)
+    while i < len(sorted_items) and sorted_items[i].startswith(prefix):
+        out.append(sorted_items[i])
+        i += 1
+    return out
+
+
+# Completion lists keyed by (buffer, cwd); covers the per-index calls and double-Tab within the TTL.
+_COMPL_CACHE: "OrderedDict[Tuple[str, str], Tuple[float, List[str]]]" = OrderedDict()
+_COMPL_TTL_S = 0.5
+_COMPL_CACHE_MAX = 32
+
+
+def _cached_completions(buffer: str, compute) -> List[str]:
+    key = (buffer, os.getcwd())
+    now = time.monotonic()
+    hit = _COMPL_CACHE.get(key)
+    if hit is not None and now - hit[0] <= _COMPL_TTL_S:
+        return hit[1]
+    matches = compute(buffer)
+    # A trailing separator means "list this directory", whose contents may change between presses.
+    if not buffer.endswith(("/", "\\", os.sep)):
+        _COMPL_CACHE[key] = (now, matches)
+        _COMPL_CACHE.move_to_end(key)
+        while len(_COMPL_CACHE) > _COMPL_CACHE_MAX:
+            _COMPL_CACHE.popitem(last=False)
+    return matches
+
+
+# Sorted (name, is_dir) listings per directory, invalidated when the directory's mtime changes.
+_DIR_LISTING_CACHE: "OrderedDict[str, Tuple[int, List[Tuple[str, bool]]]]" = OrderedDict()
+_DIR_LISTING_CACHE_MAX = 16
+
+
+def _dir_listing(scan_dir: str) -> List[Tuple[str, bool]]:
+    try:
+        mtime = os.stat(scan_dir).st_mtime_ns
+    except OSError:
+        return []
+    hit = _DIR_LISTING_CACHE.get(scan_dir)
+    if hit is not None and hit[0] == mtime:
+        _DIR_LISTING_CACHE.move_to_end(scan_dir)
+        return hit[1]
+    listing: List[Tuple[str, bool]] = []
+    try:
+        with os.scandir(scan_dir) as it:
+            for entry in it:
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+                listing.append((entry.name, is_dir))
+    except OSError:
+        return []
+    listing.sort()
+    _DIR_LISTING_CACHE[scan_dir] = (mtime, listing)
+    _DIR_LISTING_CACHE.move_to_end(scan_dir)
+    while len(_DIR_LISTING_CACHE) > _DIR_LISTING_CACHE_MAX:
+        _DIR_LISTING_CACHE.popitem(last=False)
+    return listing
+
+
+def _complete_path(expanded: str) -> List[str]:
+    """Entries starting with the last path component; the directory is listed once per change."""
+    dirname, base = os.path.split(expanded)
+    hidden_ok = base[:1] == "."
+    return [
+        os.path.join(dirname, name) + (os.sep if is_dir else "")
+        for name, is_dir in _dir_listing(dirname or ".")
+        if name.startswith(base) and (hidden_ok or name[:1] != ".")
+    ]
+
+
+_HOME = os.path.expanduser("~")
+_HOME_PREFIX_LEN = len(_HOME)
+
+HISTORY_MAX = 1000
+# History file path -> readline history length already on disk.
+_HISTORY_BASE: Dict[str, int] = {}
+
+
 def setup_readline(cfg: Dict[str, object], slash_commands: List[str]) -> Tuple[Optional[object], Optional[Path]]:
     try:
         import readline as _readline
     except Exception:
         return None, None
 
-    def completer(_text: str, state: int) -> Optional[str]:
-        buffer = _readline.get_line_buffer()
-        if buffer.startswith("/"):
-            prefix = buffer
-            matches = [c for c in slash_commands if c.startswith(prefix)]
-            if not matches:
-                needle = buffer.lstrip("/").lower()
-                matches = [c for c in slash_commands if _fuzzy_match(needle, c.lower())]
-            if state < len(matches):
-                return matches[state]
+    slash_sorted = sorted(set(slash_commands))
+    slash_lower = tuple(c.lower() for c in slash_sorted)
+
+    def compute_matches(buffer: str) -> List[str]:
+        # Still typing the command name: only slash commands apply. Arguments ("/open ./x") fall
+        # through to path completion.
+        if buffer.startswith("/") and " " not in buffer:
+            found = _prefix_matches(slash_sorted, buffer)
+            if not found:
+                needle = buffer.lstrip("/")
+                found = [c for c, low in zip(slash_sorted, slash_lower) if _fuzzy_match(needle, low)]
+            return found
         # Path completion (simple): complete last token when it looks like a path.
-        last = buffer.split()[-1] if buffer.split() else ""
+        last = buffer.rpartition(" ")[2]
         if last and (last.startswith(("~", ".", "/", "\\")) or ":" in last):
             expanded = os.path.expandvars(os.path.expanduser(last))
-            pattern = expanded + "*"
-            hits = sorted(glob.glob(pattern))
-            if hits:
-                results = []
-                for h in hits:
-                    if last.startswith("~"):
-                        home = os.path.expanduser("~")
-                        if h.startswith(home):
-                            h = "~" + h[len(home):]
-                    results.append(h)
-                if state < len(results):
-                    return results[state]
-        return None
+            hits = _complete_path(expanded)
+            if last.startswith("~"):
+                hits = ["~" + h[_HOME_PREFIX_LEN:] if h.startswith(_HOME) else h for h in hits]
+            return hits
+        return []
+
+    last_buffer: Optional[str] = None
+    last_matches: List[str] = []
+
+    def completer(_text: str, state: int) -> Optional[str]:
+        # readline asks for state 0, 1, 2, ... on one buffer; resolve the list once per Tab press.
+        nonlocal last_buffer, last_matches
+        buffer = _readline.get_line_buffer()
+        if state == 0 or buffer != last_buffer:
+            last_matches = _cached_completions(buffer, compute_matches)
+            last_buffer = buffer
+        return last_matches[state] if state < len(last_matches) else None
 
     _readline.set_completer(completer)
     try:
@@ -128,13 +229,33 @@ def setup_readline(cfg: Dict[str, object], slash_commands: List[str]) -> Tuple[O
         history_path = logs_dir / "martin_history.txt"
         if history_path.exists():
             _readline.read_history_file(str(history_path))
-        _readline.set_history_length(1000)
+        # No in-memory eviction during the session, so the count of new entries stays exact;
+        # persist_new_history applies HISTORY_MAX when it trims the file.
+        _readline.set_history_length(-1)
+        _HISTORY_BASE[str(history_path)] = _readline.get_current_history_length()
     except Exception:
         history_path = None
 
     return _readline, history_path
 
 
+def persist_new_history(readline_mod: Optional[object], history_path: Optional[Path]) -> None:
+    """Append this session's new entries to the history file instead of rewriting it."""
+    if not readline_mod or not history_path:
+        return
+    key = str(history_path)
+    current = readline_mod.get_current_history_length()
+    new_entries = current - _HISTORY_BASE.get(key, 0)
+    readline_mod.set_history_length(HISTORY_MAX)
+    append = getattr(readline_mod, "append_history_file", None)
+    if append is not None and history_path.exists():
+        if new_entries > 0:
+            append(new_entries, key)
+    else:
+        readline_mod.write_history_file(key)
+    _HISTORY_BASE[key] = current
+
+
 def print_context_summary(payload: Dict[str, object]) -> None:
     try:
         root = payload.get("root", "")
@@ -148,37 +269,87 @@ def print_context_summary(payload: Dict[str, object]) -> None:
 
 
 def shorten_output(text: str, max_len: int = 400) -> str:
-    s = (text or "").strip().replace("\r", " ")
+    if not text:
+        return ""
+    s = text.strip()
+    # Length check first so long outputs only normalize the prefix that is returned.
     if len(s) <= max_len:
-        return s
-    return s[:max_len].rstrip() + "..."
+        return s.replace("\r", " ")
+    return s[:max_len].replace("\r", " ").rstrip() + "..."
+
+
+class InputHistory:
+    """Bounded "You: " lines from the chat transcript, with lowercase copies kept for search."""
+
+    def __init__(self, maxlen: int = 1000) -> None:
+        self._lines: deque = deque(maxlen=maxlen)
+        self._lower: deque = deque(maxlen=maxlen)
+
+    def append(self, line: str) -> None:
+        self._lines.append(line)
+        self._lower.append(line.lower())
+
+    def __len__(self) -> int:
+        return len(self._lines)
+
+    def __iter__(self):
+        return iter(self._lines)
+
+    def __reversed__(self):
+        return reversed(self._lines)
+
+    def matching(self, query: str, limit: Optional[int] = None) -> List[str]:
+        """Matching lines in input order; with a limit, only the newest are scanned for."""
+        hits = (ln for ln, low in zip(reversed(self._lines), reversed(self._lower)) if query in low)
+        return list(islice(hits, limit))[::-1]
+
+
+def _matching(lines: Sequence[str], query: str, limit: Optional[int] = None) -> List[str]:
+    if isinstance(lines, InputHistory):
+        return lines.matching(query, limit)
+    hits = (ln for ln in reversed(lines) if query in ln.lower())
+    return list(islice(hits, limit))[::-1]
+
+
+def _input_lines(session_transcript: List[str], user_inputs: Optional[Sequence[str]]) -> Sequence[str]:
+    # Callers that track "You: " lines as they are appended pass them directly; otherwise filter.
+    if user_inputs is not None:
+        return user_inputs
+    return [ln for ln in session_transcript if ln.startswith("You: ")]
+
+
+def _tail(lines: Sequence[str], n: int) -> List[str]:
+    if n <= 0:
+        return list(lines)
+    return list(islice(reversed(lines), n))[::-1]
 
 
 def build_palette_entries(
     query: str,
-    slash_commands: List[str],
+    slash_commands: Sequence[str],
     session_transcript: List[str],
     root: Optional[Path] = None,
+    user_inputs: Optional[Sequence[str]] = None,
 ) -> List[tuple[str, str]]:
     root = root or Path.cwd()
     q = (query or "").lower()
-    cmd_matches = [c for c in slash_commands if _fuzzy_match(q, c.lower())]
-    history_inputs = [ln for ln in session_transcript if ln.startswith("You: ")]
+    cmd_matches = islice((c for c in slash_commands if _fuzzy_match(q, c.lower())), 20)
+    history_inputs = _input_lines(session_transcript, user_inputs)
     if q:
-        hist_matches = [ln for ln in history_inputs if q in ln.lower()]
+        hist_matches = _matching(history_inputs, q, limit=10)
     else:
-        hist_matches = history_inputs[-10:]
+        hist_matches = _tail(history_inputs, 10)
     entries: List[tuple[str, str]] = []
-    for c in cmd_matches[:20]:
+    for c in cmd_matches:
         entries.append(("cmd", c))
-    for ln in hist_matches[-10:]:
+    for ln in hist_matches:
         entries.append(("input", ln))
     if q:
         try:
-            files = build_file_entries(q, max_items=100, max_depth=4, root=root)
+            files = build_file_entries(q, max_items=100, max_depth=4, root=root, limit=10)
         except Exception:
             files = []
-        for p in files[:10]:
+        for p in files:
             entries.append(("file", p))
         try:
             from researcher.test_helpers import suggest_test_commands
@@ -190,94 +361,148 @@ def build_palette_entries(
                 entries.append(("test", t))
         out_dir = root / "logs" / "outputs"
         if out_dir.exists():
+            # Filter by name first so only matching logs are stat'ed, then take the 10 newest.
+            matches = []
             try:
-                outputs = sorted(out_dir.glob("*.log"), key=lambda p: p.stat().st_mtime, reverse=True)
-            except Exception:
-                outputs = []
-            for p in outputs:
-                val = str(p)
-                if q in val.lower():
-                    entries.append(("output", val))
-                    if len([e for e in entries if e[0] == "output"]) >= 10:
-                        break
+                with os.scandir(out_dir) as it:
+                    for entry in it:
+                        if entry.name.endswith(".log") and q in entry.path.lower():
+                            try:
+                                matches.append((entry.stat().st_mtime, entry.path))
+                            except OSError:
+                                continue
+            except OSError:
+                matches = []
+            for _, val in heapq.nlargest(10, matches):
+                entries.append(("output", val))
     return entries
 
 
-def render_palette(query: str, slash_commands: List[str], command_descriptions: Dict[str, str], session_transcript: List[str]) -> List[tuple[str, str]]:
-    entries = build_palette_entries(query, slash_commands, session_transcript)
-    try:
-        from rich.console import Console
-        from rich.panel import Panel
-        from rich.table import Table
-        console = Console()
-        table = Table(title="Palette", show_header=True, header_style="cyan")
-        table.add_column("#", style="dim", width=4)
-        table.add_column("type", style="dim", width=8)
-        table.add_column("value", style="white")
-        table.add_column("desc", style="dim")
-        for idx, (kind, value) in enumerate(entries, 1):
-            desc = command_descriptions.get(value, "") if kind == "cmd" else ""
-            table.add_row(str(idx), kind, value, desc)
-        console.print(Panel(table, title="Palette"))
-        return entries
-    except Exception:
-        pass
-    print("martin: Command palette")
+_RICH = None  # (console, Table, Panel) after the first import attempt; False when rich is unavailable
+
+
+def _get_rich():
+    """Import rich once and reuse one console; markup is off so "[...]" in values prints verbatim."""
+    global _RICH
+    if _RICH is None:
+        try:
+            from rich.console import Console
+            from rich.panel import Panel
+            from rich.table import Table
+            _RICH = (Console(highlight=False, markup=False), Table, Panel)
+        except Exception:
+            _RICH = False
+    return _RICH or None
+
+
+def render_palette(
+    query: str,
+    slash_commands: Sequence[str],
+    command_descriptions: Dict[str, str],
+    session_transcript: List[str],
+    user_inputs: Optional[Sequence[str]] = None,
+) -> List[tuple[str, str]]:
+    entries = build_palette_entries(query, slash_commands, session_transcript, user_inputs=user_inputs)
+    rich = _get_rich()
+    if rich:
+        try:
+            console, Table, Panel = rich
+            table = Table(title="Palette", show_header=True, header_style="cyan")
+            table.add_column("#", style="dim", width=4)
+            table.add_column("type", style="dim", width=8)
+            table.add_column("value", style="white")
+            table.add_column("desc", style="dim")
+            for idx, (kind, value) in enumerate(entries, 1):
+                desc = command_descriptions.get(value, "") if kind == "cmd" else ""
+                table.add_row(str(idx), kind, value, desc)
+            console.print(Panel(table, title="Palette"))
+            return entries
+        except Exception:
+            pass
+    out = ["martin: Command palette"]
     if entries:
         for idx, (kind, value) in enumerate(entries, 1):
             desc = command_descriptions.get(value, "") if kind == "cmd" else ""
             suffix = f" - {desc}" if desc else ""
-            print(f"{idx}. [{kind}] {value}{suffix}")
+            out.append(f"{idx}. [{kind}] {value}{suffix}")
     else:
-        print("martin: No matches.")
+        out.append("martin: No matches.")
+    print("\n".join(out))
     return entries
 
 
-def build_file_entries(query: str, max_items: int = 200, max_depth: int = 4, root: Optional[Path] = None) -> List[str]:
-    items = list_resources(root=root or Path.cwd(), max_items=max_items, max_depth=max_depth)
-    paths = [i.get("path", "") for i in items if isinstance(i, dict)]
+# (root, max_items, max_depth) -> (root mtime_ns, built_at, paths, lowercased paths). The root mtime
+# catches top-level changes; the TTL bounds staleness for edits deeper in the tree.
+_FILE_INDEX_CACHE: Dict[Tuple[str, int, int], Tuple[int, float, List[str], List[str]]] = {}
+_FILE_INDEX_TTL_S = 5.0
+
+
+def _file_index(root: Path, max_items: int, max_depth: int) -> Tuple[List[str], List[str]]:
+    key = (str(root), max_items, max_depth)
+    try:
+        mtime = root.stat().st_mtime_ns
+    except OSError:
+        mtime = -1
+    now = time.monotonic()
+    hit = _FILE_INDEX_CACHE.get(key)
+    if hit is not None and hit[0] == mtime and now - hit[1] <= _FILE_INDEX_TTL_S:
+        return hit[2], hit[3]
+    # Imported here: it pulls in state_manager, which the rest of this module never needs.
+    from researcher.resource_registry import list_resources
+
+    items = list_resources(root=root, max_items=max_items, max_depth=max_depth)
+    paths = [p for p in (i.get("path", "") for i in items if isinstance(i, dict)) if p]
+    lower = [p.lower() for p in paths]
+    _FILE_INDEX_CACHE[key] = (mtime, now, paths, lower)
+    return paths, lower
+
+
+def build_file_entries(
+    query: str,
+    max_items: int = 200,
+    max_depth: int = 4,
+    root: Optional[Path] = None,
+    limit: Optional[int] = None,
+) -> List[str]:
+    paths, lower = _file_index(root or Path.cwd(), max_items, max_depth)
     if not query:
-        return [p for p in paths if p]
+        return paths[:limit]
     q = query.lower()
-    return [p for p in paths if p and q in p.lower()]
+    return list(islice((p for p, lp in zip(paths, lower) if q in lp), limit))
 
 
 def render_file_picker(paths: List[str], title: str = "Files") -> None:
-    try:
-        from rich.console import Console
-        from rich.table import Table
-        console = Console()
-        table = Table(title=title, show_header=True, header_style="cyan")
-        table.add_column("#", style="dim", width=4)
-        table.add_column("path", style="white")
-        for idx, p in enumerate(paths[:30], 1):
-            table.add_row(str(idx), p)
-        console.print(table)
-        return
-    except Exception:
-        pass
-    print("martin: Files:")
-    for idx, p in enumerate(paths[:30], 1):
-        print(f"{idx}. {p}")
+    rich = _get_rich()
+    if rich:
+        try:
+            console, Table, _ = rich
+            table = Table(title=title, show_header=True, header_style="cyan")
+            table.add_column("#", style="dim", width=4)
+            table.add_column("path", style="white")
+            for idx, p in enumerate(paths[:30], 1):
+                table.add_row(str(idx), p)
+            console.print(table)
+            return
+        except Exception:
+            pass
+    print("\n".join(["martin: Files:"] + [f"{idx}. {p}" for idx, p in enumerate(paths[:30], 1)]))
 
 
 def render_history(lines: List[str], title: str = "Recent input history") -> None:
-    try:
-        from rich.console import Console
-        from rich.table import Table
-        console = Console()
-        table = Table(title=title, show_header=True, header_style="cyan")
-        table.add_column("#", style="dim", width=4)
-        table.add_column("input", style="white")
-        for idx, ln in enumerate(lines, 1):
-            table.add_row(str(idx), ln)
-        console.print(table)
-        return
-    except Exception:
-        pass
-    print(f"martin: {title}:")
-    for idx, ln in enumerate(lines, 1):
-        print(f"{idx}. {ln}")
+    rich = _get_rich()
+    if rich:
+        try:
+            console, Table, _ = rich
+            table = Table(title=title, show_header=True, header_style="cyan")
+            table.add_column("#", style="dim", width=4)
+            table.add_column("input", style="white")
+            for idx, ln in enumerate(lines, 1):
+                table.add_row(str(idx), ln)
+            console.print(table)
+            return
+        except Exception:
+            pass
+    print("\n".join([f"martin: {title}:"] + [f"{idx}. {ln}" for idx, ln in enumerate(lines, 1)]))
 
 
 def handle_history_command(
@@ -285,6 +510,7 @@ def handle_history_command(
     session_transcript: List[str],
     readline_mod: Optional[object],
     history_path: Optional[Path],
+    user_inputs: Optional[Sequence[str]] = None,
 ) -> Optional[str]:
     sub = args[0].lower() if args else ""
     if sub == "clear":
@@ -297,7 +523,8 @@ def handle_history_command(
             pass
         try:
             if history_path and history_path.exists():
-                history_path.write_text("", encoding="utf-8")
+                os.truncate(history_path, 0)
+                _HISTORY_BASE[str(history_path)] = 0
                 cleared = True
         except Exception:
             pass
@@ -308,22 +535,21 @@ def handle_history_command(
         if not query:
             print("martin: Provide text to search.")
             return None
-        lines = [ln for ln in session_transcript if ln.startswith("You: ") and query in ln.lower()]
+        lines = _matching(_input_lines(session_transcript, user_inputs), query, limit=20)
         if not lines:
             print("martin: No matching inputs.")
             return None
-        render_history(lines[-20:], title="Matching input history")
+        render_history(lines, title="Matching input history")
         return None
     if sub == "pick":
         try:
             idx = int(args[1]) if len(args) > 1 else 0
         except Exception:
             idx = 0
-        lines = [ln for ln in session_transcript if ln.startswith("You: ")]
-        if not lines:
+        window = _tail(_input_lines(session_transcript, user_inputs), 20)
+        if not window:
             print("martin: No input history captured.")
             return None
-        window = lines[-20:]
         if not (1 <= idx <= len(window)):
             print("martin: Use /history pick <n> from the last 20 entries.")
             return None
@@ -335,11 +561,11 @@ def handle_history_command(
         limit = int(args[0]) if args else 20
     except Exception:
         limit = 20
-    lines = [ln for ln in session_transcript if ln.startswith("You: ")]
+    lines = _tail(_input_lines(session_transcript, user_inputs), limit)
     if not lines:
         print("martin: No input history captured.")
         return None
-    render_history(lines[-limit:], title="Recent input history")
+    render_history(lines, title="Recent input history")
     return None
 
 
@@ -379,12 +605,12 @@ def render_status_banner(
             line = f"{line}\n{context_line}"
     if not line:
         return
-    try:
-        from rich.console import Console
-        from rich.panel import Panel
-        console = Console()
-        console.print(Panel(line, title="Workspace", style="cyan"))
-        return
-    except Exception:
-        pass
+    rich = _get_rich()
+    if rich:
+        try:
+            console, _, Panel = rich
+            console.print(Panel(line, title="Workspace", style="cyan"))
+            return
+        except Exception:
+            pass
     print(f"martin: {line}")
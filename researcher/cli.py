@@ -1,73 +1,140 @@
 import argparse
+import atexit
 import builtins
+import contextlib
 import datetime
+import functools
+import itertools
 import logging
 import os
 import re
+import shlex
 import sys
 import time
 import json # Added for main loop
 import traceback
 import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import List, Dict, Any, Optional, Tuple
+try:
+    import orjson
+except Exception:
+    orjson = None
 
 if __package__ is None and __name__ == "__main__":
     sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
 from researcher import sanitize
 from researcher.config_loader import load_config, ensure_dirs
-from researcher.index import SimpleIndex, FaissIndex
-from researcher.index_utils import save_index_from_config
-from researcher.ingester import ingest_files
 from researcher.log_utils import setup_logger
-from researcher.provenance import build_response
-from researcher.answer import compose_answer
 # Removed: from researcher.martin_behaviors import sanitize_and_extract, run_plan
 from researcher.supervisor import nudge_message
-from researcher.local_llm import run_ollama_chat, run_ollama_chat_stream, check_ollama_health
 from researcher import chat_ui
-from researcher.tui_shell import run_tui
-from researcher.remote_transport import start_tunnel, stop_tunnel, status_tunnel, validate_transport
 from researcher.system_context import get_system_context
 
-# New imports for Librarian client
-from researcher.librarian_client import LibrarianClient
-from researcher.socket_server import SocketServer
-from researcher.socket_test_bridge import TestSocketBridge
+# Index backends, ingester, provenance (pydantic), local LLM, TUI, remote transport, Librarian
+# client and socket servers are imported inside the commands that use them so --help/status/ask
+# skip that import graph.
 
 # New imports for Martin's main loop
-from researcher.state_manager import load_state, save_state, log_event, SessionCtx, ROOT_DIR, LEDGER_FILE
+from researcher.state_manager import load_state, save_state as _save_state, log_event, SessionCtx, ROOT_DIR, LEDGER_FILE, STATE_FILE
 from researcher import __version__
 
-_ASK_CACHE = {}
-_ASK_CACHE_KEYS = []
+_ASK_CACHE: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
 _ASK_CACHE_MAX = 32
+_SEM_CACHE: "OrderedDict[str, Any]" = OrderedDict()
+_SEM_CACHE_THRESHOLD = 0.95
 _CLI_LOGGER = None
+_STATE_CACHE: Dict[str, Any] = {}
+_HEALTH_CACHE: Dict[str, Any] = {"ts": 0.0, "key": None, "value": None}
+_HEALTH_TTL_S = 10.0
+_LIBRARIAN_CLIENT = None
 _LAST_PATH = ""
 _LAST_LISTING = []
 _MEMORY_DIRTY = False
 _OUTPUT_DIR = Path("logs") / "outputs"
+_OUTPUT_DIR_READY = False
+_TS_CACHE: Tuple[int, str] = (-1, "")
+_FOLLOWUP_EXACT = frozenset({"do that", "do it", "continue", "go ahead", "yes", "y", "ok", "okay", "yep", "sure"})
+_FOLLOWUP_PREFIXES = ("continue", "go ahead", "do that", "do it")
+_SHORT_FOLLOWUP = frozenset({
+    "sounds good", "looks good", "all good", "go for it", "go ahead",
+    "ok", "okay", "sure", "yes", "y", "yep", "yup", "fine",
+})
+_SHORT_NEGATIVE = ("new goal", "change goal", "reset goal", "stop", "cancel")
+_QUOTES = "\"' "
+_TRAILING_PUNCT = ").,;:!?]"
+_PATH_RE = re.compile(r"[A-Za-z]:\\[^\s\"']+|/[^\s\"']+")
+_INGEST_SKIP_DIRS = frozenset({".git", "node_modules", "__pycache__", ".venv", "venv", "dist", "build"})
+_INGEST_NOTE_MAX_BYTES = 2 * 1024 * 1024
+_SCAN_POOL_MAX_WORKERS = 32
+_SANITIZE_CACHE_MAX_CHARS = 4096
+_STATUS_STATE_FIELDS = ("session_count", "last_session_start", "ledger_entries", "workspace_path")
+_REVIEW_CMD_RE = re.compile(r"^\s*command:\s*.+", re.IGNORECASE)
+_SHELL_OPERATORS = frozenset({"&&", "||", "|", ">", ">>", "<", "<<", ";", "&"})
+_DESKTOP_NAME_RE = re.compile(r"([A-Za-z0-9_\- .]+\.[A-Za-z0-9]{1,5})")
 
 
+def _dumps(payload: Any, indent: bool = False) -> str:
+    # orjson emits compact UTF-8; the stdlib fallback is configured to match it on plain data.
+    if orjson is not None:
+        opt = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0)
+        try:
+            return orjson.dumps(payload, option=opt).decode("utf-8")
+        except TypeError:
+            pass
+    if indent:
+        return json.dumps(payload, ensure_ascii=False, indent=2)
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+
+
+def _print_json(payload: Any) -> None:
+    if orjson is not None:
+        sys.stdout.write(_dumps(payload) + "\n")
+        return
+    # Stream the encoder's chunks into stdout instead of building the whole document first.
+    json.dump(payload, sys.stdout, ensure_ascii=False, separators=(",", ":"))
+    sys.stdout.write("\n")
+
+
 def _format_output_for_display(output: str, max_chars: int = 4000) -> str:
     if not output:
         return ""
     if len(output) <= max_chars:
         return output
-    lines = output.splitlines()
-    summary = f"[output summary: {len(lines)} lines, {len(output)} chars]"
+    # Count newlines in C rather than materializing a list of every line of a large output.
+    line_count = output.count("\n") + (0 if output.endswith("\n") else 1)
+    summary = f"[output summary: {line_count} lines, {len(output)} chars]"
     head = output[:2000].rstrip()
     tail = output[-2000:].lstrip()
     return summary + "\n" + head + "\n...\n[output truncated]\n...\n" + tail
 
 
+def _utc_iso_now() -> str:
+    # Timestamps have one-second resolution, so reuse the formatted string within the same second.
+    global _TS_CACHE
+    now = int(time.time())
+    if now != _TS_CACHE[0]:
+        _TS_CACHE = (now, time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(now)))
+    return _TS_CACHE[1]
+
+
+def _ensure_output_dir() -> Path:
+    global _OUTPUT_DIR_READY
+    if not _OUTPUT_DIR_READY:
+        _OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+        _OUTPUT_DIR_READY = True
+    return _OUTPUT_DIR
+
+
 def _store_long_output(output: str, label: str) -> str:
     if not output or len(output) <= 4000:
         return ""
     try:
         from researcher.file_utils import preview_write
-        _OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+        _ensure_output_dir()
         ts = time.strftime("%Y%m%d_%H%M%S", time.gmtime())
         path = _OUTPUT_DIR / f"{ts}_{label}.log"
         if preview_write(path, output):
@@ -81,12 +148,12 @@ def _write_crash_log(exc: BaseException) -> str:
     if _privacy_enabled_state():
         return ""
     try:
-        _OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+        _ensure_output_dir()
         ts = time.strftime("%Y%m%d_%H%M%S", time.gmtime())
         path = _OUTPUT_DIR / f"{ts}_crash.log"
         payload = [
             "martin crash report",
-            f"time_utc: {time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())}",
+            f"time_utc: {_utc_iso_now()}",
             f"cwd: {Path.cwd()}",
             f"argv: {sys.argv}",
             f"python: {sys.version}",
@@ -102,9 +169,48 @@ def _write_crash_log(exc: BaseException) -> str:
         return ""
 
 
+@functools.lru_cache(maxsize=1)
+def _cfg_cached() -> Dict[str, Any]:
+    # Config is not written back during a CLI invocation, so one parse serves every helper.
+    return load_config()
+
+
+def _state_signature() -> Optional[Tuple[int, int]]:
+    try:
+        info = os.stat(STATE_FILE)
+    except OSError:
+        return None
+    return (info.st_mtime_ns, info.st_size)
+
+
+def _state_cached() -> Dict[str, Any]:
+    """Read-only view of the state file, re-parsed only when the file changes on disk.
+
+    log_event() saves through state_manager directly, so the cache is validated against the
+    file's mtime/size rather than trusted until the next save_state() in this module.
+    Callers that mutate state must keep using load_state().
+    """
+    sig = _state_signature()
+    if sig is not None and _STATE_CACHE.get("sig") == sig:
+        return _STATE_CACHE["state"]
+    st = load_state()
+    _STATE_CACHE["sig"] = sig
+    _STATE_CACHE["state"] = st
+    return st
+
+
+def _state_cache_invalidate() -> None:
+    _STATE_CACHE.clear()
+
+
+def save_state(st: Dict[str, Any]) -> None:
+    _save_state(st)
+    _state_cache_invalidate()
+
+
 def _privacy_enabled_state() -> bool:
     try:
-        st = load_state()
+        st = _state_cached()
         return st.get("session_privacy") == "no-log"
     except Exception:
         return False
@@ -114,7 +220,7 @@ def _logging_verbose(cfg: Optional[Dict[str, Any]] = None) -> bool:
     if _privacy_enabled_state():
         return False
     try:
-        cfg = cfg or load_config()
+        cfg = cfg or _cfg_cached()
     except Exception:
         cfg = cfg or {}
     logging_cfg = cfg.get("logging", {}) or {}
@@ -123,7 +229,7 @@ def _logging_verbose(cfg: Optional[Dict[str, Any]] = None) -> bool:
 
 def _behavior_cfg(cfg: Optional[Dict[str, Any]] = None) -> Dict[str, bool]:
     try:
-        cfg = cfg or load_config()
+        cfg = cfg or _cfg_cached()
     except Exception:
         cfg = cfg or {}
     behavior = cfg.get("behavior", {}) or {}
@@ -137,7 +243,7 @@ def _behavior_cfg(cfg: Optional[Dict[str, Any]] = None) -> Dict[str, bool]:
 
 def _ui_cfg(cfg: Optional[Dict[str, Any]] = None) -> Dict[str, bool]:
     try:
-        cfg = cfg or load_config()
+        cfg = cfg or _cfg_cached()
     except Exception:
         cfg = cfg or {}
     ui = cfg.get("ui", {}) or {}
@@ -147,10 +253,65 @@ def _ui_cfg(cfg: Optional[Dict[str, Any]] = None) -> Dict[str, bool]:
     }
 
 
+@functools.lru_cache(maxsize=1024)
+def _sanitize_memo(text: str) -> Tuple[str, bool]:
+    return sanitize.sanitize_prompt(text)
+
+
+def _sanitize_cached(text: str) -> Tuple[str, bool]:
+    # The same prompt is sanitized by several helpers per command; file-sized texts are unique
+    # and would only pin memory, so they bypass the cache.
+    if not text:
+        return text, False
+    if len(text) > _SANITIZE_CACHE_MAX_CHARS:
+        return sanitize.sanitize_prompt(text)
+    return _sanitize_memo(text)
+
+
+def _new_recent_files(prev: Dict[str, Any], curr: Dict[str, Any], limit: int = 20) -> List[str]:
+    # recent_files is unique and newest-first, so stop after the first `limit` unseen entries.
+    prev_set = frozenset(prev.get("recent_files", []) or ())
+    fresh = (p for p in (curr.get("recent_files", []) or ()) if p not in prev_set)
+    return sorted(itertools.islice(fresh, limit))
+
+
+@functools.lru_cache(maxsize=256)
+def _split_command(cmd: str) -> Tuple[str, ...]:
+    # Only the pure tokenization is memoized; path checks depend on env vars and symlinks and run every time.
+    try:
+        return tuple(shlex.split(cmd))
+    except Exception:
+        return tuple(cmd.split())
+
+
+def _outside_workspace_target(cmd: str, ws: Path) -> Optional[str]:
+    tokens = _split_command(cmd)
+    for idx, tok in enumerate(tokens):
+        if tok in _SHELL_OPERATORS or tok.startswith("-"):
+            continue
+        candidate = tok
+        if tok.lower() in ("cd", "set-location", "pushd") and idx + 1 < len(tokens):
+            candidate = tokens[idx + 1]
+        expanded = os.path.expandvars(os.path.expanduser(candidate))
+        try:
+            path = Path(expanded)
+        except Exception:
+            continue
+        if not path.is_absolute():
+            continue
+        try:
+            resolved = path.resolve()
+        except Exception:
+            resolved = path
+        if resolved != ws and ws not in resolved.parents:
+            return str(resolved)
+    return None
+
+
 def _summarize_user_input(text: str, max_len: int = 200) -> Tuple[str, bool]:
     if not text:
         return "", False
-    sanitized, changed = sanitize.sanitize_prompt(text)
+    sanitized, changed = _sanitize_cached(text)
     summary = chat_ui.shorten_output(sanitized, max_len=max_len)
     return summary, changed
 
@@ -158,7 +319,7 @@ def _summarize_user_input(text: str, max_len: int = 200) -> Tuple[str, bool]:
 def _summarize_text(text: str, max_len: int = 200) -> Tuple[str, bool]:
     if not text:
         return "", False
-    sanitized, changed = sanitize.sanitize_prompt(text)
+    sanitized, changed = _sanitize_cached(text)
     summary = chat_ui.shorten_output(sanitized, max_len=max_len)
     return summary, changed
 
@@ -167,7 +328,7 @@ def _sanitize_command_list(cmds: List[str]) -> Tuple[List[str], bool]:
     out: List[str] = []
     any_changed = False
     for cmd in cmds:
-        sanitized, changed = sanitize.sanitize_prompt(cmd)
+        sanitized, changed = _sanitize_cached(cmd)
         any_changed = any_changed or changed
         out.append(chat_ui.shorten_output(sanitized, max_len=200))
     return out, any_changed
@@ -177,26 +338,24 @@ def _is_followup(text: str) -> bool:
     lowered = (text or "").strip().lower()
     if not lowered:
         return False
-    if lowered in {"do that", "do it", "continue", "go ahead", "yes", "y", "ok", "okay", "yep", "sure"}:
+    if lowered in _FOLLOWUP_EXACT:
         return True
-    return lowered.startswith(("continue", "go ahead", "do that", "do it"))
+    return lowered.startswith(_FOLLOWUP_PREFIXES)
 
 
 def _is_short_followup(text: str) -> bool:
     lowered = (text or "").strip().lower()
     if not lowered:
         return False
-    if any(k in lowered for k in ("new goal", "change goal", "reset goal", "stop", "cancel")):
+    if any(k in lowered for k in _SHORT_NEGATIVE):
         return False
-    if lowered in {"sounds good", "looks good", "all good", "go for it", "go ahead"}:
-        return True
-    return lowered in {"ok", "okay", "sure", "yes", "y", "yep", "yup", "fine"}
+    return lowered in _SHORT_FOLLOWUP
 
 
 def _ingest_allowlist(cfg: Dict[str, Any]) -> Dict[str, Any]:
     ingest_cfg = cfg.get("ingest", {}) or {}
-    roots = [Path(r).resolve() for r in (ingest_cfg.get("allowlist_roots") or []) if r]
-    exts = [e.lower().lstrip(".") for e in (ingest_cfg.get("allowlist_exts") or []) if e]
+    roots = tuple(Path(r).resolve() for r in (ingest_cfg.get("allowlist_roots") or []) if r)
+    exts = frozenset(e.lower().lstrip(".") for e in (ingest_cfg.get("allowlist_exts") or []) if e)
     mode = (ingest_cfg.get("allowlist_mode") or "warn").lower()
     return {"roots": roots, "exts": exts, "mode": mode}
 
@@ -211,18 +370,19 @@ def _scan_proprietary_cfg(cfg: Dict[str, Any]) -> Dict[str, Any]:
 
 
 def _is_path_allowed(path: Path, allowlist: Dict[str, Any]) -> bool:
-    roots = allowlist.get("roots") or []
-    exts = allowlist.get("exts") or []
-    if roots and not any(path == r or r in path.parents for r in roots):
+    roots = allowlist.get("roots") or ()
+    exts = allowlist.get("exts") or frozenset()
+    if roots and not any(path.is_relative_to(r) for r in roots):
         return False
     if exts:
-        if path.suffix.lower().lstrip(".") not in exts:
+        ext = path.suffix.lower().lstrip(".")
+        if ext not in exts:
             return False
     return True
 
 
 def _scan_text_for_sensitive(text: str) -> Tuple[bool, str]:
-    sanitized, changed = sanitize.sanitize_prompt(text or "")
+    sanitized, changed = _sanitize_cached(text or "")
     if changed:
         return True, "redaction_detected"
     return False, ""
@@ -257,7 +417,7 @@ def _build_active_context(st: Dict[str, Any]) -> Dict[str, Any]:
 
 def _plan_to_tasks(cmds: List[str]) -> List[Dict[str, str]]:
     tasks: List[Dict[str, str]] = []
-    ts = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+    ts = _utc_iso_now()
     for cmd in cmds:
         raw = cmd.strip()
         if raw.lower().startswith("command:"):
@@ -331,19 +491,43 @@ def _get_cli_logger(cfg):
     _CLI_LOGGER = setup_logger(logs_dir / "martin.log", name="martin.cli")
     return _CLI_LOGGER
 
+def _health_cached(host: str, model: str, ttl: float = _HEALTH_TTL_S) -> Dict[str, Any]:
+    # status is polled by /status and the service endpoint; reuse a recent probe instead of an HTTP round-trip.
+    from researcher.local_llm import check_ollama_health
+    key = (host, model)
+    now = time.monotonic()
+    if _HEALTH_CACHE["key"] == key and now - _HEALTH_CACHE["ts"] < ttl:
+        return _HEALTH_CACHE["value"]
+    value = check_ollama_health(host, model)
+    _HEALTH_CACHE.update(ts=now, key=key, value=value)
+    return value
+
+
+def _get_librarian():
+    # One persistent IPC connection per process; the client serializes requests and reconnects
+    # if the Librarian dropped the socket in between.
+    global _LIBRARIAN_CLIENT
+    if _LIBRARIAN_CLIENT is None:
+        from researcher.librarian_client import LibrarianClient
+        _LIBRARIAN_CLIENT = LibrarianClient()
+        atexit.register(_LIBRARIAN_CLIENT.close)
+    return _LIBRARIAN_CLIENT
+
+
 def get_status_payload(cfg, force_simple: bool = False) -> Dict[str, Any]:
     import time
     from researcher.llm_utils import MODEL_MAIN
+    from researcher.remote_transport import status_tunnel
     t0 = time.perf_counter()
     idx = _load_index(cfg, force_simple=force_simple)
     load_ms = (time.perf_counter() - t0) * 1000.0
     vs = cfg.get("vector_store", {}) or {}
-    st = load_state()
+    st = _state_cached()
     local_llm_cfg = cfg.get("local_llm", {}) or {}
     local_enabled = bool(local_llm_cfg.get("enabled", cfg.get("local_llm_enabled", False)))
     local_stream = bool(local_llm_cfg.get("streaming", False))
     fallbacks = local_llm_cfg.get("fallbacks", []) or []
-    health = check_ollama_health(cfg.get("ollama_host", "http://localhost:11434"), cfg.get("local_model", "phi3"))
+    health = _health_cached(cfg.get("ollama_host", "http://localhost:11434"), cfg.get("local_model", "phi3"))
     remote_status = {}
     try:
         remote_status = status_tunnel(cfg)
@@ -388,6 +572,7 @@ def read_prompt(args: argparse.Namespace) -> str:
 
 
 def _load_index(cfg, force_simple: bool = False):
+    from researcher.index import SimpleIndex, FaissIndex
     vs = cfg.get("vector_store", {}) or {}
     index_path = Path(vs.get("index_path", "data/index/mock_index.pkl"))
     mock_path = Path(vs.get("mock_index_path", "data/index/mock_index.pkl"))
@@ -413,7 +598,7 @@ def cmd_status(cfg, force_simple: bool = False, as_json: bool = False) -> int:
     payload = get_status_payload(cfg, force_simple=force_simple)
     _get_cli_logger(cfg).info("status force_simple=%s as_json=%s", force_simple, as_json)
     if as_json:
-        print(json.dumps(payload, ensure_ascii=False))
+        _print_json(payload)
         return 0
     console = Console()
     table = Table(title="Status")
@@ -443,67 +628,81 @@ def cmd_status(cfg, force_simple: bool = False, as_json: bool = False) -> int:
     state_table.add_column("field", style="cyan")
     state_table.add_column("value", style="white")
     state = payload.get("state", {}) or {}
-    state_table.add_row("session_count", str(state.get("session_count")))
-    state_table.add_row("last_session_start", str(state.get("last_session_start")))
-    state_table.add_row("ledger_entries", str(state.get("ledger_entries")))
-    state_table.add_row("workspace_path", str(state.get("workspace_path")))
+    for key in _STATUS_STATE_FIELDS:
+        state_table.add_row(key, str(state.get(key)))
     state_table.add_row("local_only", str(payload.get("local_only")))
     console.print(state_table)
     return 0
 
 
-def _collect_ingest_files(inputs: List[str], exts: Optional[List[str]] = None, max_files: int = 0) -> List[str]:
+def _iter_tree_files(root: str):
+    # Depth-first scandir walk; hidden and dependency/build dirs never contain ingestable sources.
+    stack = [root]
+    while stack:
+        current = stack.pop()
+        subdirs = []
+        try:
+            with os.scandir(current) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if not entry.name.startswith(".") and entry.name not in _INGEST_SKIP_DIRS:
+                                subdirs.append(entry.path)
+                        elif entry.is_file():
+                            yield entry.path
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+        stack.extend(reversed(subdirs))
+
+
+def _collect_ingest_files(inputs: List[str], exts: Optional[List[str]] = None, max_files: int = 0) -> List[str]:
     import glob
-    files = []
     seen = set()
-    exts_norm = [e.lower().lstrip(".") for e in (exts or []) if e]
+    out: List[str] = []
+    exts_norm = frozenset(e.lower().lstrip(".") for e in (exts or []) if e)
     for item in inputs:
         if "*" in item or "?" in item:
-            matches = glob.glob(item, recursive=True)
-            for m in matches:
-                p = Path(m)
-                if p.is_file():
-                    files.append(str(p))
+            candidates = (str(Path(m)) for m in glob.iglob(item, recursive=True) if os.path.isfile(m))
         else:
             p = Path(item)
             if p.is_dir():
-                for f in p.rglob("*"):
-                    if f.is_file():
-                        files.append(str(f))
+                candidates = _iter_tree_files(str(p))
             elif p.is_file():
-                files.append(str(p))
-    out = []
-    for f in files:
-        if max_files and len(out) >= max_files:
-            break
-        p = Path(f)
-        if exts_norm:
-            if p.suffix.lower().lstrip(".") not in exts_norm:
+                candidates = (str(p),)
+            else:
                 continue
-        if f in seen:
-            continue
-        seen.add(f)
-        out.append(f)
-    return out
+        for f in candidates:
+            if exts_norm and os.path.splitext(f)[1].lower().lstrip(".") not in exts_norm:
+                continue
+            if f in seen:
+                continue
+            seen.add(f)
+            out.append(f)
+            if max_files and len(out) >= max_files:
+                return out
+    return out
 
 
 def _extract_paths_from_text(text: str) -> List[str]:
-    candidates: List[str] = []
+    # Runs on every chat message: only path-shaped text is worth tokenizing and stat-ing.
+    matches = _PATH_RE.findall(text or "")
+    if not matches:
+        return []
     try:
-        candidates.extend(shlex.split(text))
-    except Exception:
-        candidates.extend(text.split())
-    candidates.extend(re.findall(r"[A-Za-z]:\\[^\s\"']+|/[^\s\"']+", text))
+        candidates = shlex.split(text)
+    except ValueError:
+        candidates = text.split()
+    candidates.extend(matches)
     seen = set()
     out: List[str] = []
-    for raw in candidates:
-        val = raw.strip().strip("\"'")
-        val = val.rstrip(").,;:!?]")
-        if not val or val in seen:
+    for raw in dict.fromkeys(candidates):
+        val = raw.strip(_QUOTES).rstrip(_TRAILING_PUNCT)
+        if not val or ("/" not in val and "\\" not in val) or val in seen:
             continue
-        p = Path(val)
-        if p.exists():
-            seen.add(val)
+        seen.add(val)
+        if Path(val).exists():
             out.append(val)
     return out
 
@@ -527,7 +726,7 @@ def _extract_desktop_targets(text: str) -> List[str]:
         base = ctx["paths"]["desktop"]
     if not base:
         return []
-    matches = re.findall(r"([A-Za-z0-9_\- .]+\\.[A-Za-z0-9]{1,5})", text)
+    matches = _DESKTOP_NAME_RE.findall(text)
     out: List[str] = []
     for name in matches:
         candidate = str(Path(base) / name.strip())
@@ -543,13 +742,20 @@ def _build_librarian_ingest_note(paths: List[str], max_files: int = 5, max_chars
     for p in paths[:max_files]:
         name = Path(p).name
         try:
-            text = Path(p).read_text(encoding="utf-8", errors="ignore")
+            size = os.stat(p).st_size
+            if size > _INGEST_NOTE_MAX_BYTES:
+                parts.append(f"- {name}: [skipped: too large]")
+                continue
+            # Only the head of the file feeds the preview, so never read past it.
+            with open(p, "rb") as f:
+                head = f.read(max_chars * 2)
         except Exception as e:
             parts.append(f"- {name}: [read error: {e}]")
             continue
-        if len(text) > max_chars:
+        text = head.decode("utf-8", errors="ignore")
+        if len(text) > max_chars or size > len(head):
             text = text[:max_chars] + "\n...[truncated]"
-        sanitized, _ = sanitize.sanitize_prompt(text)
+        sanitized, _ = _sanitize_cached(text)
         preview = " ".join((sanitized or "").split())
         if len(preview) > 400:
             preview = preview[:400] + "…"
@@ -560,7 +766,7 @@ def _build_librarian_ingest_note(paths: List[str], max_files: int = 5, max_chars
 
 
 def _confirm_cloud_send(prompt: str, approval_policy: str, agent_mode: bool = False, as_json: bool = False) -> Tuple[bool, str]:
-    sanitized, _changed = sanitize.sanitize_prompt(prompt or "")
+    sanitized, _changed = _sanitize_cached(prompt or "")
     if approval_policy == "never" or agent_mode:
         return True, sanitized
     if as_json:
@@ -581,7 +787,9 @@ def cmd_ingest(cfg, paths: List[str], force_simple: bool = False, exts: Optional
     local_only = bool(cfg.get("local_only")) or os.environ.get("RESEARCHER_LOCAL_ONLY", "").strip().lower() in {"1", "true", "yes"}
     if local_only:
         skip_librarian = True
-    ensure_dirs(cfg)
+    from researcher.index_utils import save_index_from_config
+    from researcher.ingester import ingest_files
+    ensure_dirs(cfg)
     st = load_state()
     _get_cli_logger(cfg).info("ingest paths=%d force_simple=%s max_files=%d", len(paths), force_simple, max_files)
     expanded = _collect_ingest_files(paths, exts=exts, max_files=max_files)
@@ -590,8 +798,10 @@ def cmd_ingest(cfg, paths: List[str], force_simple: bool = False, exts: Optional
     scan_cfg = _scan_proprietary_cfg(cfg)
     blocked_paths = []
     allowed_paths = []
+    # Roots are resolved, so candidates must be too; resolve each once, and only when roots apply.
+    resolve_paths = bool(allowlist.get("roots"))
     for p in existing_paths:
-        path = Path(p)
+        path = Path(p).resolve(strict=False) if resolve_paths else Path(p)
         if not _is_path_allowed(path, allowlist):
             blocked_paths.append(p)
             continue
@@ -601,7 +811,7 @@ def cmd_ingest(cfg, paths: List[str], force_simple: bool = False, exts: Optional
         if allowlist.get("mode") == "block":
             msg = "Ingest blocked by allowlist."
             if as_json:
-                print(json.dumps({"ok": False, "error": "allowlist_blocked", "blocked": blocked_paths[:10]}, ensure_ascii=False))
+                print(_dumps({"ok": False, "error": "allowlist_blocked", "blocked": blocked_paths[:10]}))
             else:
                 print(msg, file=sys.stderr)
             return 1
@@ -609,7 +819,7 @@ def cmd_ingest(cfg, paths: List[str], force_simple: bool = False, exts: Optional
         msg = "No valid files found to ingest."
         log_event(st, "ingest_command_failed", files_count=0, error="no_valid_files")
         if as_json:
-            print(json.dumps({"ok": False, "error": "no_valid_files"}, ensure_ascii=False))
+            print(_dumps({"ok": False, "error": "no_valid_files"}))
         else:
             print(msg, file=sys.stderr)
         return 1
@@ -620,21 +830,31 @@ def cmd_ingest(cfg, paths: List[str], force_simple: bool = False, exts: Optional
     files = [Path(p) for p in allowed_paths]
     scan_hits = []
     if scan_cfg.get("enabled"):
-        for fp in files:
+        max_bytes = scan_cfg.get("max_bytes", 200000)
+
+        def _scan_one(fp: Path) -> Optional[Dict[str, str]]:
             try:
-                data = fp.read_bytes()[: scan_cfg.get("max_bytes", 200000)]
-                text = data.decode("utf-8", errors="ignore")
+                with fp.open("rb") as f:
+                    text = f.read(max_bytes).decode("utf-8", errors="ignore")
             except Exception:
-                continue
+                return None
             flagged, reason = _scan_text_for_sensitive(text)
-            if flagged:
-                scan_hits.append({"path": str(fp), "reason": reason})
+            return {"path": str(fp), "reason": reason} if flagged else None
+
+        # Reads dominate the scan; overlapping them across files hides disk latency.
+        workers = min(_SCAN_POOL_MAX_WORKERS, (os.cpu_count() or 1) * 4, len(files))
+        if workers > 1:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="martin-scan") as pool:
+                results = list(pool.map(_scan_one, files))
+        else:
+            results = [_scan_one(fp) for fp in files]
+        scan_hits = [hit for hit in results if hit]
         if scan_hits:
             log_event(st, "ingest_scan_flagged", hits=len(scan_hits), samples=scan_hits[:5])
             if scan_cfg.get("mode") == "block":
                 msg = "Ingest blocked by proprietary scan."
                 if as_json:
-                    print(json.dumps({"ok": False, "error": "scan_blocked", "hits": scan_hits[:5]}, ensure_ascii=False))
+                    print(_dumps({"ok": False, "error": "scan_blocked", "hits": scan_hits[:5]}))
                 else:
                     print(msg, file=sys.stderr)
                 return 1
@@ -642,24 +862,22 @@ def cmd_ingest(cfg, paths: List[str], force_simple: bool = False, exts: Optional
     save_index_from_config(cfg, idx)
     log_event(st, "ingest_command", files_count=len(files), errors_count=len(local_result.get("errors", [])), idx_type="local")
     try:
-        st = load_state()
-        st["last_ingest"] = {"ts": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()), "count": local_result.get("ingested", 0), "mode": "local"}
+        # log_event() already persisted st, so it is current; no need to re-read the file.
+        st["last_ingest"] = {"ts": _utc_iso_now(), "count": local_result.get("ingested", 0), "mode": "local"}
         save_state(st)
     except Exception:
         pass
     if not skip_librarian:
         try:
-            st = load_state()
             if st.get("session_privacy") != "no-log":
                 note = _build_librarian_ingest_note(existing_paths)
                 if note:
-                    client = LibrarianClient()
+                    client = _get_librarian()
                     client.ingest_text(note, topic="local_ingest_notice", source="local_ingest_redacted")
-                    client.close()
         except Exception:
             pass
     if as_json:
-        print(json.dumps({"ok": True, "mode": "local", "ingested": local_result.get("ingested", 0), "errors": local_result.get("errors", [])}, ensure_ascii=False))
+        _print_json({"ok": True, "mode": "local", "ingested": local_result.get("ingested", 0), "errors": local_result.get("errors", [])})
     else:
         for err in local_result.get("errors", []):
             print(f"error: {err}", file=sys.stderr)
@@ -667,35 +885,157 @@ def cmd_ingest(cfg, paths: List[str], force_simple: bool = False, exts: Optional
     return 0
 
 
+class _SpinnerDaemon:
+    """One shared spinner thread for the process; callers toggle it around slow calls."""
+
+    _FRAMES = ("|", "/", "-", "\\")
+
+    def __init__(self) -> None:
+        self._cv = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self.active = False
+        self.current_label = ""
+        self._label_ref: Optional[Dict[str, str]] = None
+
+    def start(self, label: str, label_ref: Optional[Dict[str, str]] = None) -> "_SpinnerDaemon":
+        with self._cv:
+            self.current_label = label
+            self._label_ref = label_ref
+            self.active = True
+            if self._thread is None:
+                # Started on first use so commands that never spin don't pay for a thread.
+                self._thread = threading.Thread(target=self._run, name="martin-spinner", daemon=True)
+                self._thread.start()
+            self._cv.notify()
+        return self
+
+    def stop(self) -> None:
+        with self._cv:
+            if not self.active:
+                return
+            self.active = False
+            self._label_ref = None
+            # Clear under the lock so the line is gone before the caller prints anything else.
+            print("\r" + (" " * 120) + "\r", end="", flush=True)
+            self._cv.notify()
+
+    def __enter__(self) -> "_SpinnerDaemon":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def _run(self) -> None:
+        idx = 0
+        with self._cv:
+            while True:
+                while not self.active:
+                    self._cv.wait()
+                current = (self._label_ref.get("label") if self._label_ref else None) or self.current_label
+                print(f"\rmartin: Working: {current} {self._FRAMES[idx % len(self._FRAMES)]}", end="", flush=True)
+                idx += 1
+                self._cv.wait(timeout=0.25)
+
+
+_SPINNER = _SpinnerDaemon()
+
+
+def _print_results_table(title: str, entries) -> None:
+    rows = [(f"{entry.score:.3f}", entry.source, entry.text[:80]) for entry in entries]
+    # Piped/scripted runs get plain tab-separated lines; rich layout only pays off on a terminal.
+    rich = chat_ui._get_rich() if sys.stdout.isatty() else None
+    if not rich:
+        print("\n".join([title, "score\tsource\tchunk"] + ["\t".join(row) for row in rows]))
+        return
+    console, Table, _Panel = rich
+    table = Table(title=title)
+    table.add_column("score", style="cyan")
+    table.add_column("source", style="magenta")
+    table.add_column("chunk", style="white")
+    for row in rows:
+        table.add_row(*row)
+    console.print(table)
+
+
+def _ask_cache_put(key: str, payload: Dict[str, Any], qvec: Any = None, scope: Any = None) -> None:
+    _ASK_CACHE[key] = payload
+    _ASK_CACHE.move_to_end(key)
+    if qvec is not None:
+        _SEM_CACHE[key] = (scope, qvec)
+    while len(_ASK_CACHE) > _ASK_CACHE_MAX:
+        old, _ = _ASK_CACHE.popitem(last=False)
+        _SEM_CACHE.pop(old, None)
+
+
+def _semantic_cache_lookup(qvec: Any, threshold: float, scope: Any = None) -> Optional[str]:
+    # Paraphrases of a cached prompt reuse its answer; the probe is one small matmul over <= _ASK_CACHE_MAX rows.
+    # Only entries computed under the same (k, use_llm, cloud_mode) scope are candidates.
+    import numpy as np
+    keys = [key for key, (s, _vec) in _SEM_CACHE.items() if s == scope and key in _ASK_CACHE]
+    if not keys:
+        return None
+    scores = np.stack([_SEM_CACHE[key][1] for key in keys]) @ qvec
+    best = int(scores.argmax())
+    return keys[best] if float(scores[best]) >= threshold else None
+
+
+def _semantic_probe(idx, text: str, sem_cfg: Dict[str, Any], scope: Any = None) -> Tuple[Any, Optional[str]]:
+    """Embed the prompt once; returns (qvec, key of a cached near-duplicate). Off unless semantic_cache.enabled."""
+    from researcher.index import FaissIndex
+    # Only real sentence embeddings are meaningful for similarity; SimpleIndex's ordinal vectors are not.
+    if not sem_cfg.get("enabled", False) or not isinstance(idx, FaissIndex) or idx.index is None or not idx.meta:
+        return None, None
+    try:
+        qvec = idx.embed([text])[0]
+    except Exception:
+        return None, None
+    return qvec, _semantic_cache_lookup(qvec, float(sem_cfg.get("threshold", _SEM_CACHE_THRESHOLD)), scope)
+
+
 def cmd_ask(cfg, prompt: str, k: int, use_llm: bool = False, cloud_mode: str = "off", cloud_cmd: str = "", cloud_threshold: float = None, force_simple: bool = False, as_json: bool = False) -> int:
-    from rich.console import Console
-    from rich.table import Table
+    from researcher.answer import compose_answer
     from researcher.cloud_bridge import _hash
+    from researcher.index import FaissIndex
+    from researcher.local_llm import run_ollama_chat, run_ollama_chat_stream
+    from researcher.provenance import build_response
     ensure_dirs(cfg)
     st = load_state() # Load state for logging
     _get_cli_logger(cfg).info("ask prompt_len=%d k=%d use_llm=%s cloud_mode=%s force_simple=%s as_json=%s", len(prompt or ""), k, use_llm, cloud_mode, force_simple, as_json)
     if not (prompt or "").strip():
         if as_json:
-            print(json.dumps({"ok": False, "error": "empty_prompt"}, ensure_ascii=False))
+            print(_dumps({"ok": False, "error": "empty_prompt"}))
         else:
             print("No prompt provided (use args or --stdin).", file=sys.stderr)
         log_event(st, "ask_command_failed", error="empty_prompt")
         return 1
     # logger = setup_logger(Path(cfg.get("data_paths", {}).get("logs", "logs")) / "local.log") # No longer needed directly here
     vs = cfg.get("vector_store", {}) or {}
+    ollama_host = cfg.get("ollama_host", "http://localhost:11434")
+    auto_cfg = cfg.get("auto_update") or {}
+    ingest_threshold = auto_cfg.get("ingest_threshold", 0.1)
+    ingest_cloud = auto_cfg.get("ingest_cloud_answers", False)
     idx_path = Path(vs.get("index_path", "data/index/mock_index.pkl"))
     idx = _load_index(cfg, force_simple=force_simple)
-    sanitized, changed = sanitize.sanitize_prompt(prompt)
-    # Simple memo cache (in-process)
-    cache_key = _hash(sanitized)
+    sanitized, changed = _sanitize_cached(prompt)
+    # Simple memo cache (in-process); results depend on k/use_llm/cloud_mode, so they are part of the key.
+    cache_scope = (k, bool(use_llm), cloud_mode)
+    cache_key = _hash("|".join(map(str, cache_scope)) + "|" + sanitized)
     cached = _ASK_CACHE.get(cache_key)
+    qvec = None
+    if not cached:
+        qvec, sem_key = _semantic_probe(idx, sanitized, cfg.get("semantic_cache") or {}, cache_scope)
+        if sem_key:
+            log_event(st, "ask_semcache_hit", key=sem_key)
+            cache_key = sem_key
+            cached = _ASK_CACHE[sem_key]
     if cached:
+        _ASK_CACHE.move_to_end(cache_key)
         answer = cached.get("answer", "")
         hits = cached.get("hits", [])
         cloud_hits = cached.get("cloud_hits", [])
         log_event(st, "ask_cache_hit", key=cache_key)
         if as_json:
-            print(json.dumps({
+            _print_json({
                 "ok": True,
                 "cached": True,
                 "answer": answer,
@@ -703,49 +1043,31 @@ def cmd_ask(cfg, prompt: str, k: int, use_llm: bool = False, cloud_mode: str = "
                 "hits": hits,
                 "cloud_hits": cloud_hits,
                 "sanitized": changed,
-            }, ensure_ascii=False))
+            })
             return 0
         resp = build_response("cli", answer=answer, hits=hits, logs_ref=str(idx_path), cloud_hits=cloud_hits)
-        console = Console()
         print(f"[cache] confidence: cached | hits: {len(hits)} | cloud: {len(cloud_hits)}")
         print("\nAnswer:\n" + answer + "\n")
-        table = Table(title="Local Results (cached)")
-        table.add_column("score", style="cyan")
-        table.add_column("source", style="magenta")
-        table.add_column("chunk", style="white")
-        for entry in resp.provenance.get("local", []):
-            table.add_row(f"{entry.score:.3f}", entry.source, entry.text[:80])
-        console.print(table)
+        _print_results_table("Local Results (cached)", resp.provenance.get("local", []))
         if resp.provenance.get("cloud"):
-            cloud_table = Table(title="Cloud Results (cached)")
-            cloud_table.add_column("score", style="cyan")
-            cloud_table.add_column("source", style="magenta")
-            cloud_table.add_column("chunk", style="white")
-            for entry in resp.provenance["cloud"]:
-                cloud_table.add_row(f"{entry.score:.3f}", entry.source, entry.text[:80])
-            console.print(cloud_table)
+            _print_results_table("Cloud Results (cached)", resp.provenance["cloud"])
         if changed:
             print("[sanitized input used]", file=sys.stderr)
         return 0
 
-    hits = idx.search(sanitized, k=k)
+    hits = idx.search_vector(qvec, k=k) if qvec is not None else idx.search(sanitized, k=k)
     trust_policy = cfg.get("trust_policy", {}) or {}
     allowed_sources = trust_policy.get("allow_sources") or []
     if allowed_sources:
-        filtered = []
-        for score, meta in hits:
-            trust = (meta.get("trust") or "internal").lower()
-            if trust in [s.lower() for s in allowed_sources]:
-                filtered.append((score, meta))
+        allowed_lower = frozenset(str(s).lower() for s in allowed_sources)
+        filtered = [(score, meta) for score, meta in hits if (meta.get("trust") or "internal").lower() in allowed_lower]
         if len(filtered) != len(hits):
             log_event(st, "rag_trust_filter", before=len(hits), after=len(filtered))
         hits = filtered
-    top_score = max([h[0] for h in hits], default=0.0)
+    top_score = max((h[0] for h in hits), default=0.0)
     log_event(st, "ask_command", k=k, hits_count=len(hits), top_score=top_score, sanitized=changed) # Use state_manager's log_event
-    gap_threshold = cfg.get("auto_update", {}).get("ingest_threshold", 0.1)
-    if top_score < gap_threshold:
-        sanitized_prompt, changed_gap = sanitize.sanitize_prompt(prompt or "")
-        log_event(st, "rag_gap", top_score=top_score, prompt=sanitized_prompt, sanitized=changed_gap)
+    if top_score < ingest_threshold:
+        log_event(st, "rag_gap", top_score=top_score, prompt=sanitized, sanitized=changed)
     answer = compose_answer(hits)
     cloud_hits = []
     # Variable to track if a cloud answer was suggested for ingestion
@@ -758,23 +1080,23 @@ def cmd_ask(cfg, prompt: str, k: int, use_llm: bool = False, cloud_mode: str = "
     fallbacks = local_llm_cfg.get("fallbacks", []) or []
     streamed = False
     if local_enabled or use_llm:
-        ctx = "\n".join([meta.get("chunk", "") for _, meta in hits][:3])
+        ctx = "\n".join(meta.get("chunk", "") for _, meta in hits[:3])
         llm_prompt = f"Context:\n{ctx}\n\nUser question:\n{prompt}\n\nAnswer concisely. If no context, say so."
         model = cfg.get("local_model", "phi3")
         if local_stream:
             def _stream_token(tok: str) -> None:
                 print(tok, end="", flush=True)
             print("Answer (streaming):")
-            llm_answer = run_ollama_chat_stream(model, llm_prompt, cfg.get("ollama_host", "http://localhost:11434"), on_token=_stream_token)
+            llm_answer = run_ollama_chat_stream(model, llm_prompt, ollama_host, on_token=_stream_token)
             print("")
             streamed = True
         else:
-            llm_answer = run_ollama_chat(model, llm_prompt, cfg.get("ollama_host", "http://localhost:11434"))
+            llm_answer = run_ollama_chat(model, llm_prompt, ollama_host)
         if not llm_answer and fallbacks:
             for fb in fallbacks:
                 if not fb:
                     continue
-                llm_answer = run_ollama_chat(fb, llm_prompt, cfg.get("ollama_host", "http://localhost:11434"))
+                llm_answer = run_ollama_chat(fb, llm_prompt, ollama_host)
                 if llm_answer:
                     log_event(st, "ask_local_llm_fallback", model=fb)
                     break
@@ -783,10 +1105,8 @@ def cmd_ask(cfg, prompt: str, k: int, use_llm: bool = False, cloud_mode: str = "
             answer = llm_answer
 
     # --- Auto-update trigger: Low confidence local retrieval ---
-    # Retrieve auto_ingest_threshold from config, default to 0.1
-    auto_ingest_threshold = cfg.get("auto_update", {}).get("ingest_threshold", 0.1)
-    if top_score < auto_ingest_threshold:
-        log_event(st, "low_confidence_retrieval", top_score=top_score, threshold=auto_ingest_threshold, prompt=prompt)
+    if top_score < ingest_threshold:
+        log_event(st, "low_confidence_retrieval", top_score=top_score, threshold=ingest_threshold, prompt=prompt)
         print(f"\033[93mmartin: Low confidence local retrieval (score: {top_score:.2f}). Consider ingesting more relevant documents for '{prompt}'.\033[0m", file=sys.stderr)
 
     # Optional cloud hop
@@ -799,7 +1119,7 @@ def cmd_ask(cfg, prompt: str, k: int, use_llm: bool = False, cloud_mode: str = "
         from researcher.cloud_bridge import _hash
         exec_cfg = cfg.get("execution", {}) or {}
         approval_policy = (exec_cfg.get("approval_policy") or "on-request").lower()
-        client = LibrarianClient()
+        client = _get_librarian()
         allow_cloud, sanitized_prompt = _confirm_cloud_send(prompt or "", approval_policy, agent_mode=False, as_json=as_json)
         if allow_cloud:
             cloud_resp = client.query_cloud(
@@ -810,7 +1130,6 @@ def cmd_ask(cfg, prompt: str, k: int, use_llm: bool = False, cloud_mode: str = "
             )
         else:
             cloud_resp = {"status": "error", "message": "user_denied"}
-        client.close() # Close connection after use
 
         # Adapt cloud_resp from Librarian to CloudCallResult format for existing logic
         if cloud_resp.get("status") == "success":
@@ -837,18 +1156,24 @@ def cmd_ask(cfg, prompt: str, k: int, use_llm: bool = False, cloud_mode: str = "
         if result_ok and result_output:
             cloud_hits.append((0.0, {"path": "cloud", "chunk": result_output}))
             # --- Auto-update trigger: Ingest successful cloud answer ---
-            if cfg.get("auto_update", {}).get("ingest_cloud_answers", False):
-                from researcher.ingester import simple_chunk
-                chunks = simple_chunk(result_output)
+            if ingest_cloud:
+                from researcher.ingester import iter_chunks
+                # One pass over the answer builds chunks and metas together.
+                chunks = []
+                metas = []
+                for c in iter_chunks(result_output):
+                    chunks.append(c)
+                    metas.append({"path": "cloud", "chunk": c[:200], "provenance": "cloud"})
                 if chunks:
                     if isinstance(idx, FaissIndex):
-                        metas = [{"path": "cloud", "chunk": c[:200], "provenance": "cloud"} for c in chunks]
                         idx.add(chunks, metas)
+                    elif hasattr(idx, "add_batch"):
+                        idx.add_batch(chunks, metas)
                     else:
-                        for c in chunks:
-                            idx.add(c, {"path": "cloud", "chunk": c[:200], "provenance": "cloud"})
-                    if hasattr(idx, "save"):
-                        idx.save()
+                        for c, meta in zip(chunks, metas):
+                            idx.add(c, meta)
+                    from researcher.index_utils import save_index_from_config
+                    save_index_from_config(cfg, idx)
                     log_event(st, "ingest_cloud_answer", chunks=len(chunks), cloud_output_hash=_hash(result_output), prompt=prompt)
                     print(f"\033[92mmartin: Cloud answer ingested into local RAG ({len(chunks)} chunks).\033[0m", file=sys.stderr)
                     cloud_answer_ingested = True # Set flag for response building
@@ -865,10 +1190,8 @@ def cmd_ask(cfg, prompt: str, k: int, use_llm: bool = False, cloud_mode: str = "
     # For now, just pass cloud_answer_ingested status through logs_ref or similar if needed.
     # The actual ingestion of the cloud answer would be a separate, more complex step. # Use state_manager's log_event
 
-    resp = build_response("cli", answer=answer, hits=hits, logs_ref=str(idx_path), cloud_hits=cloud_hits)
-    console = Console()
     if as_json:
-        print(json.dumps({
+        _print_json({
             "ok": True,
             "cached": False,
             "answer": answer,
@@ -876,39 +1199,20 @@ def cmd_ask(cfg, prompt: str, k: int, use_llm: bool = False, cloud_mode: str = "
             "hits": hits,
             "cloud_hits": cloud_hits,
             "sanitized": changed,
-        }, ensure_ascii=False))
-        _ASK_CACHE[cache_key] = {"answer": answer, "hits": hits, "cloud_hits": cloud_hits}
-        _ASK_CACHE_KEYS.append(cache_key)
-        if len(_ASK_CACHE_KEYS) > _ASK_CACHE_MAX:
-            old = _ASK_CACHE_KEYS.pop(0)
-            _ASK_CACHE.pop(old, None)
+        })
+        _ask_cache_put(cache_key, {"answer": answer, "hits": hits, "cloud_hits": cloud_hits}, qvec, cache_scope)
         log_event(st, "ask_cache_put", key=cache_key)
         return 0
-    print(f"confidence: {top_score:.3f} | hits: {len(hits)} | cloud: {len(cloud_hits)}")
-    if not streamed:
-        print("\nAnswer:\n" + answer + "\n")
-    table = Table(title="Local Results")
-    table.add_column("score", style="cyan")
-    table.add_column("source", style="magenta")
-    table.add_column("chunk", style="white")
-    for entry in resp.provenance.get("local", []):
-        table.add_row(f"{entry.score:.3f}", entry.source, entry.text[:80])
-    console.print(table)
+    resp = build_response("cli", answer=answer, hits=hits, logs_ref=str(idx_path), cloud_hits=cloud_hits)
+    print(f"confidence: {top_score:.3f} | hits: {len(hits)} | cloud: {len(cloud_hits)}")
+    if not streamed:
+        print("\nAnswer:\n" + answer + "\n")
+    _print_results_table("Local Results", resp.provenance.get("local", []))
     if resp.provenance.get("cloud"):
-        cloud_table = Table(title="Cloud Results")
-        cloud_table.add_column("score", style="cyan")
-        cloud_table.add_column("source", style="magenta")
-        cloud_table.add_column("chunk", style="white")
-        for entry in resp.provenance["cloud"]:
-            cloud_table.add_row(f"{entry.score:.3f}", entry.source, entry.text[:80])
-        console.print(cloud_table)
+        _print_results_table("Cloud Results", resp.provenance["cloud"])
     if changed:
         print("[sanitized input used]", file=sys.stderr)
-    _ASK_CACHE[cache_key] = {"answer": answer, "hits": hits, "cloud_hits": cloud_hits}
-    _ASK_CACHE_KEYS.append(cache_key)
-    if len(_ASK_CACHE_KEYS) > _ASK_CACHE_MAX:
-        old = _ASK_CACHE_KEYS.pop(0)
-        _ASK_CACHE.pop(old, None)
+    _ask_cache_put(cache_key, {"answer": answer, "hits": hits, "cloud_hits": cloud_hits}, qvec, cache_scope)
     log_event(st, "ask_cache_put", key=cache_key)
     return 0
 
@@ -920,7 +1224,9 @@ def cmd_chat(cfg, args) -> int:
     from researcher.orchestrator import decide_next_step, dispatch_internal_ability
     from researcher.resource_registry import list_resources, read_resource
     from researcher.runner import run_command_smart_capture, enforce_sandbox
-    from researcher.librarian_client import LibrarianClient
+    from researcher.remote_transport import start_tunnel, stop_tunnel, status_tunnel, validate_transport
+    from researcher.socket_server import SocketServer
+    from researcher.socket_test_bridge import TestSocketBridge
     from researcher.system_context import get_system_context
     from researcher.tool_ledger import append_tool_entry, read_recent, export_json, build_export_json
     from researcher.file_utils import preview_write
@@ -958,7 +1264,7 @@ def cmd_chat(cfg, args) -> int:
                 except Exception:
                     cutoff = None
             inbox.append({
-                "ts": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                "ts": _utc_iso_now(),
                 "message": message,
             })
             if cutoff:
@@ -981,17 +1287,17 @@ def cmd_chat(cfg, args) -> int:
     def _context_delta(prev: Dict[str, Any], curr: Dict[str, Any]) -> Dict[str, Any]:
         delta: Dict[str, Any] = {}
         try:
-            prev_recent = set(prev.get("recent_files", []) or [])
-            curr_recent = set(curr.get("recent_files", []) or [])
-            if curr_recent - prev_recent:
-                delta["new_recent_files"] = sorted(list(curr_recent - prev_recent))[:20]
+            new_recent = _new_recent_files(prev, curr)
+            if new_recent:
+                delta["new_recent_files"] = new_recent
         except Exception:
             pass
         try:
-            prev_git = (prev.get("git_status") or "").splitlines()
-            curr_git = (curr.get("git_status") or "").splitlines()
+            prev_git = prev.get("git_status") or ""
+            curr_git = curr.get("git_status") or ""
             if prev_git or curr_git:
-                delta["git_status"] = (curr_git[:1][0] if curr_git else "")
+                # Only the first line is reported; don't split the whole status.
+                delta["git_status"] = curr_git.partition("\n")[0].rstrip("\r")
         except Exception:
             pass
         return delta
@@ -999,20 +1305,21 @@ def cmd_chat(cfg, args) -> int:
     def _safe_json(text: str) -> Dict[str, Any]:
         if not text:
             return {}
+        loads = orjson.loads if orjson is not None else json.loads
         try:
-            return json.loads(text)
+            return loads(text)
         except Exception:
             pass
         m = re.search(r"\{.*\}", text, flags=re.DOTALL)
         if not m:
             return {}
         try:
-            return json.loads(m.group(0))
+            return loads(m.group(0))
         except Exception:
             return {}
 
     def _plan_action_queue(prompt: str, ctx: Dict[str, Any]) -> List[Dict[str, Any]]:
-        sanitized, _changed = sanitize.sanitize_prompt(prompt or "")
+        sanitized, _changed = _sanitize_cached(prompt or "")
         ctx_summary = {
             "root": ctx.get("root"),
             "git": (ctx.get("git_status") or "").splitlines()[:1],
@@ -1027,7 +1334,7 @@ def cmd_chat(cfg, args) -> int:
         )
         planner_user = (
             f"User request:\n{sanitized}\n\n"
-            f"Context:\n{json.dumps(ctx_summary, ensure_ascii=False)}\n\n"
+            f"Context:\n{_dumps(ctx_summary)}\n\n"
             "Return JSON only."
         )
         payload = {
@@ -1111,7 +1418,7 @@ def cmd_chat(cfg, args) -> int:
             confirm = "no"
         if confirm == "yes":
             st["onboarding_complete"] = True
-            st["onboarding_ts"] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+            st["onboarding_ts"] = _utc_iso_now()
             save_state(st)
             print("martin: Onboarding marked complete.")
     def _mo_preflight_check() -> None:
@@ -1167,27 +1474,11 @@ def cmd_chat(cfg, args) -> int:
             return
         print(f"\rmartin: Working: {label}", end="", flush=True)
 
-    def _work_status_done() -> None:
-        if not sys.stdout.isatty():
-            return
-        print("\r" + (" " * 120) + "\r", end="", flush=True)
-
-    def _work_spinner(label: str, stop_event: threading.Event, label_ref: Optional[Dict[str, str]] = None) -> threading.Thread:
+    def _work_spinner(label: str, label_ref: Optional[Dict[str, str]] = None):
         if not sys.stdout.isatty():
             _work_status(label)
-            return threading.Thread()
-        def _spin() -> None:
-            frames = ["|", "/", "-", "\\"]
-            idx = 0
-            while not stop_event.is_set():
-                current = (label_ref.get("label") if label_ref else None) or label
-                print(f"\rmartin: Working: {current} {frames[idx % len(frames)]}", end="", flush=True)
-                idx += 1
-                time.sleep(0.25)
-            _work_status_done()
-        t = threading.Thread(target=_spin, daemon=True)
-        t.start()
-        return t
+            return contextlib.nullcontext()
+        return _SPINNER.start(label, label_ref)
 
     def _ensure_handle() -> str:
         st = load_state()
@@ -1253,11 +1544,11 @@ def cmd_chat(cfg, args) -> int:
     def _format_review_response(text: str) -> str:
         if not text:
             return "Findings:\n- None.\n\nQuestions:\n- None.\n\nTests:\n- Not run."
-        import re as _re
-        cmd_re = _re.compile(r"^\s*command:\s*.+", _re.IGNORECASE)
         lines = text.splitlines()
-        cmd_lines = [line for line in lines if cmd_re.match(line)]
-        body_lines = [line for line in lines if not cmd_re.match(line)]
+        cmd_lines = []
+        body_lines = []
+        for line in lines:
+            (cmd_lines if _REVIEW_CMD_RE.match(line) else body_lines).append(line)
         body = "\n".join(body_lines).strip()
         lower = body.lower()
         has_findings = "findings" in lower
@@ -1285,32 +1576,7 @@ def cmd_chat(cfg, args) -> int:
             print(f"martin: {label}: {summary}")
 
     def _outside_workspace_path(cmd: str) -> Optional[str]:
-        ws = Path.cwd().resolve()
-        try:
-            tokens = shlex.split(cmd)
-        except Exception:
-            tokens = cmd.split()
-        skip = {"&&", "||", "|", ">", ">>", "<", "<<", ";", "&"}
-        for idx, tok in enumerate(tokens):
-            if tok in skip or tok.startswith("-"):
-                continue
-            candidate = tok
-            if tok.lower() in ("cd", "set-location", "pushd") and idx + 1 < len(tokens):
-                candidate = tokens[idx + 1]
-            expanded = os.path.expandvars(os.path.expanduser(candidate))
-            try:
-                path = Path(expanded)
-            except Exception:
-                continue
-            if not path.is_absolute():
-                continue
-            try:
-                resolved = path.resolve()
-            except Exception:
-                resolved = path
-            if resolved != ws and ws not in resolved.parents:
-                return str(resolved)
-        return None
+        return _outside_workspace_target(cmd, Path.cwd().resolve())
 
     def _confirm_outside_workspace(target: str, cmd: str) -> bool:
         exec_cfg = cfg.get("execution", {}) or {}
@@ -1447,7 +1713,7 @@ def cmd_chat(cfg, args) -> int:
                 "cmd": cmd,
                 "rc": rc,
                 "reason": reason,
-                "ts": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                "ts": _utc_iso_now(),
                 "acked": False,
             }
             save_state(st)
@@ -1505,7 +1771,7 @@ def cmd_chat(cfg, args) -> int:
         sess.begin()
         try:
             st = load_state()
-            st["session_start_ts"] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+            st["session_start_ts"] = _utc_iso_now()
             save_state(st)
         except Exception:
             pass
@@ -1560,6 +1826,8 @@ def cmd_chat(cfg, args) -> int:
                 resp = "no"
             return resp == "yes"
         session_transcript = []
+        # "You: " lines from session_transcript, kept separately so /history and /palette skip the filter.
+        user_inputs = chat_ui.InputHistory(maxlen=1000)
         slash_commands = chat_ui.get_slash_commands()
         command_descriptions = chat_ui.get_command_descriptions()
         if "/files" not in slash_commands:
@@ -1856,7 +2124,7 @@ def cmd_chat(cfg, args) -> int:
                         st = load_state()
                         st["last_failed_command"]["acked"] = True
                         st["last_command_summary"] = {
-                            "ts": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                            "ts": _utc_iso_now(),
                             "cmd": cmd,
                             "rc": rc,
                             "ok": ok,
@@ -1900,7 +2168,7 @@ def cmd_chat(cfg, args) -> int:
                         "encryption_key_set": key_set,
                         "next_steps": next_steps,
                     }
-                    print(json.dumps(report, ensure_ascii=False, indent=2))
+                    print(_dumps(report, indent=True))
                     return True
                 if name == "signoff":
                     if transcript:
@@ -1911,7 +2179,7 @@ def cmd_chat(cfg, args) -> int:
                     print(summary)
                     try:
                         st = load_state()
-                        st["last_signoff_ts"] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+                        st["last_signoff_ts"] = _utc_iso_now()
                         save_state(st)
                     except Exception:
                         pass
@@ -1919,7 +2187,7 @@ def cmd_chat(cfg, args) -> int:
                     return True
                 if name == "status":
                     payload = get_status_payload(cfg, force_simple=False)
-                    print(json.dumps(payload, ensure_ascii=False))
+                    print(_dumps(payload))
                     return True
                 if name == "memory":
                     st = load_state()
@@ -1929,10 +2197,10 @@ def cmd_chat(cfg, args) -> int:
                         "session_memory": st.get("session_memory", {}),
                         "session_history": st.get("session_history", []),
                     }
-                    print(json.dumps(payload, ensure_ascii=False, indent=2))
+                    print(_dumps(payload, indent=True))
                     return True
                 if name == "history":
-                    picked = chat_ui.handle_history_command(args, session_transcript, readline_mod, history_path)
+                    picked = chat_ui.handle_history_command(args, session_transcript, readline_mod, history_path, user_inputs=user_inputs)
                     if picked:
                         last_user_request = picked
                     return True
@@ -1945,7 +2213,7 @@ def cmd_chat(cfg, args) -> int:
                             idx = 0
                         entries = last_palette_entries
                         if not entries:
-                            entries = chat_ui.render_palette("", slash_commands, command_descriptions, session_transcript)
+                            entries = chat_ui.render_palette("", slash_commands, command_descriptions, session_transcript, user_inputs=user_inputs)
                             last_palette_entries = entries
                         if not (1 <= idx <= len(entries)):
                             print("martin: Use /palette pick <n> from the last palette view.")
@@ -1961,7 +2229,7 @@ def cmd_chat(cfg, args) -> int:
                             print(f"martin: Picked input: {value}")
                             print("martin: Press Up arrow to edit/reuse.")
                         return True
-                    last_palette_entries = chat_ui.render_palette(query, slash_commands, command_descriptions, session_transcript)
+                    last_palette_entries = chat_ui.render_palette(query, slash_commands, command_descriptions, session_transcript, user_inputs=user_inputs)
                     return True
                 if name == "files":
                     query = " ".join(args).strip().lower()
@@ -2026,7 +2294,7 @@ def cmd_chat(cfg, args) -> int:
                         rationale = st.get("last_plan_rationale", "")
                         if rationale:
                             payload["rationale"] = rationale
-                    print(json.dumps(payload, ensure_ascii=False, indent=2))
+                    print(_dumps(payload, indent=True))
                     return True
                 if name == "outputs":
                     if args and args[0] == "search":
@@ -2142,19 +2410,19 @@ def cmd_chat(cfg, args) -> int:
                         print("martin: No resume snapshot found.")
                         return True
                     _apply_resume_snapshot(snapshot)
-                    print(json.dumps(snapshot, ensure_ascii=False, indent=2))
+                    print(_dumps(snapshot, indent=True))
                     return True
                 if name == "abilities":
                     try:
                         from researcher.orchestrator import ABILITY_REGISTRY
                         payload = {"abilities": sorted(list(ABILITY_REGISTRY.keys()))}
-                        print(json.dumps(payload, ensure_ascii=False, indent=2))
+                        print(_dumps(payload, indent=True))
                     except Exception:
                         print("martin: Unable to load abilities.")
                     return True
                 if name == "resources":
                     payload = list_resources()
-                    print(json.dumps({"root": str(ROOT_DIR), "items": payload}, ensure_ascii=False, indent=2))
+                    print(_dumps({"root": str(ROOT_DIR), "items": payload}, indent=True))
                     return True
                 if name == "resource":
                     if not args:
@@ -2163,7 +2431,7 @@ def cmd_chat(cfg, args) -> int:
                     path = " ".join(args)
                     ok, result = read_resource(path)
                     result["ok"] = ok
-                    print(json.dumps(result, ensure_ascii=False, indent=2))
+                    print(_dumps(result, indent=True))
                     return True
                 if name == "tests":
                     try:
@@ -2194,7 +2462,7 @@ def cmd_chat(cfg, args) -> int:
                                     "rc": rc,
                                     "ok": ok,
                                     "duration_s": round(duration, 3),
-                                    "ts": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                                    "ts": _utc_iso_now(),
                                 }
                                 save_state(st)
                                 log_event(st, "tests_run", cmd=cmd, ok=ok, rc=rc, duration_s=duration)
@@ -2222,7 +2490,7 @@ def cmd_chat(cfg, args) -> int:
                         try:
                             st = load_state()
                             st["last_command_summary"] = {
-                                "ts": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                                "ts": _utc_iso_now(),
                                 "cmd": cmd,
                                 "rc": rc,
                                 "ok": ok,
@@ -2245,7 +2513,7 @@ def cmd_chat(cfg, args) -> int:
                                 "rc": rc,
                                 "ok": ok,
                                 "duration_s": round(duration, 3),
-                                "ts": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                                "ts": _utc_iso_now(),
                             }
                             save_state(st)
                         except Exception:
@@ -2272,7 +2540,7 @@ def cmd_chat(cfg, args) -> int:
                         if not text:
                             print("martin: Provide task text.")
                             return True
-                        tasks.append({"text": text, "ts": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())})
+                        tasks.append({"text": text, "ts": _utc_iso_now()})
                         st["tasks"] = tasks[-100:]
                         st.pop("tasks_prompted", None)
                         save_state(st)
@@ -2339,7 +2607,7 @@ def cmd_chat(cfg, args) -> int:
                         "recent_gaps": gaps,
                         "last_ingest": st.get("last_ingest", {}),
                     }
-                    print(json.dumps(payload, ensure_ascii=False, indent=2))
+                    print(_dumps(payload, indent=True))
                     return True
                 if name == "host":
                     st = load_state()
@@ -2362,7 +2630,7 @@ def cmd_chat(cfg, args) -> int:
                         if any(d.get("name") == name for d in devices):
                             print("martin: Device already paired.")
                             return True
-                        device = {"name": name, "paired_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())}
+                        device = {"name": name, "paired_at": _utc_iso_now()}
                         devices.append(device)
                         st["devices"] = devices
                         st["current_host"] = name
@@ -2409,13 +2677,13 @@ def cmd_chat(cfg, args) -> int:
                     if action == "status":
                         resp = status_tunnel(cfg)
                         resp["validation"] = validate_transport(cfg)
-                        print(json.dumps(resp, ensure_ascii=False, indent=2))
+                        print(_dumps(resp, indent=True))
                         return True
                     if action == "config":
                         st = load_state()
                         overrides = st.get("remote_transport_overrides", {}) if isinstance(st, dict) else {}
                         if len(args) == 1 or args[1].lower() == "show":
-                            print(json.dumps({"overrides": overrides}, ensure_ascii=False, indent=2))
+                            print(_dumps({"overrides": overrides}, indent=True))
                             return True
                         if args[1].lower() == "set":
                             if len(args) < 4:
@@ -2472,7 +2740,7 @@ def cmd_chat(cfg, args) -> int:
                     except Exception:
                         pass
                     report = {"window_days": days, "entries": total, "redacted_entries": redacted}
-                    print(json.dumps(report, ensure_ascii=False, indent=2))
+                    print(_dumps(report, indent=True))
                     return True
                 if name == "trust":
                     if not args or args[0].lower() != "keygen":
@@ -2565,14 +2833,14 @@ def cmd_chat(cfg, args) -> int:
                     out_path = args[1] if len(args) > 1 else str(Path("logs") / "session_export.json")
                     st = load_state()
                     bundle = {
-                        "ts": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                        "ts": _utc_iso_now(),
                         "transcript_tail": st.get("resume_snapshot", {}).get("transcript_tail", []),
                         "context_cache": st.get("context_cache", {}),
                         "tasks": st.get("tasks", []),
                         "tool_ledger": read_recent(limit=50),
                     }
                     try:
-                        content = json.dumps(bundle, ensure_ascii=False, indent=2) + "\n"
+                        content = _dumps(bundle, indent=True) + "\n"
                         try:
                             st = load_state()
                             current_host = st.get("current_host", "") if isinstance(st, dict) else ""
@@ -2661,9 +2929,9 @@ def cmd_chat(cfg, args) -> int:
                         if not topic:
                             print("martin: Provide a topic to request.")
                             return True
-                        client = LibrarianClient()
+                        client = _get_librarian()
                         resp = client.request_research(topic)
-                        print(json.dumps(resp, ensure_ascii=False, indent=2))
+                        print(_dumps(resp, indent=True))
                         log_event(load_state(), "librarian_request", topic=topic, status=resp.get("status"))
                         return True
                     if action == "sources":
@@ -2671,9 +2939,9 @@ def cmd_chat(cfg, args) -> int:
                         if not topic:
                             print("martin: Provide a topic to request sources.")
                             return True
-                        client = LibrarianClient()
+                        client = _get_librarian()
                         resp = client.request_sources(topic)
-                        print(json.dumps(resp, ensure_ascii=False, indent=2))
+                        print(_dumps(resp, indent=True))
                         log_event(load_state(), "librarian_sources_request", topic=topic, status=resp.get("status"))
                         return True
                     if action == "accept":
@@ -2699,18 +2967,18 @@ def cmd_chat(cfg, args) -> int:
                         summary = details.get("summary", "")
                         sources_text = details.get("sources_text", "")
                         topic = details.get("topic") or details.get("prompt") or "librarian_note"
-                        client = LibrarianClient()
+                        client = _get_librarian()
                         if sources_text:
                             resp = client.ingest_text(sources_text, topic=topic, source="librarian_sources")
-                            print(json.dumps(resp, ensure_ascii=False, indent=2))
+                            print(_dumps(resp, indent=True))
                             log_event(load_state(), "librarian_ingest_sources", topic=topic, status=resp.get("status"))
                         elif not summary:
                             resp = client.request_research(topic)
-                            print(json.dumps(resp, ensure_ascii=False, indent=2))
+                            print(_dumps(resp, indent=True))
                             log_event(load_state(), "librarian_request_from_gap", topic=topic, status=resp.get("status"))
                         else:
                             resp = client.ingest_text(summary, topic=topic, source="librarian_note")
-                            print(json.dumps(resp, ensure_ascii=False, indent=2))
+                            print(_dumps(resp, indent=True))
                             log_event(load_state(), "librarian_ingest_text", topic=topic, status=resp.get("status"))
                         if resp.get("status") == "success":
                             st["librarian_inbox"] = [i for i in inbox if i is not item]
@@ -2771,21 +3039,19 @@ def cmd_chat(cfg, args) -> int:
                         st = load_state()
                         prev = st.get("resume_snapshot", {}).get("context_cache", {})
                         if isinstance(prev, dict):
-                            prev_recent = set(prev.get("recent_files", []) or [])
-                            curr_recent = set(payload.get("recent_files", []) or [])
                             payload["context_diff"] = {
-                                "new_recent_files": sorted(list(curr_recent - prev_recent))[:20]
+                                "new_recent_files": _new_recent_files(prev, payload)
                             }
                         if behavior_flags.get("context_block"):
                             payload["active_context"] = _build_active_context(st)
                     except Exception:
                         pass
-                    print(json.dumps(payload, ensure_ascii=False, indent=2))
+                    print(_dumps(payload, indent=True))
                     return True
                 if name == "goal":
                     st = load_state()
                     if not args or args[0].lower() == "status":
-                        print(json.dumps({"active_goal": st.get("active_goal", "")}, ensure_ascii=False, indent=2))
+                        print(_dumps({"active_goal": st.get("active_goal", "")}, indent=True))
                         return True
                     action = args[0].lower()
                     if action == "set":
@@ -2881,7 +3147,7 @@ def cmd_chat(cfg, args) -> int:
             if cloud_enabled and cfg.get("cloud", {}).get("trigger_on_disagreement") and _is_disagreement(user_input) and not cfg.get("local_only"):
                 prompt = (last_user_request or user_input).strip()
                 prompt = f"{prompt}\n\nUser feedback: {user_input}\nPlease answer correctly."
-                client = LibrarianClient()
+                client = _get_librarian()
                 allow_cloud, sanitized_prompt = _confirm_cloud_send(prompt or "", approval_policy, agent_mode=agent_mode, as_json=False)
                 if allow_cloud:
                     cloud_resp = client.query_cloud(
@@ -2891,7 +3157,6 @@ def cmd_chat(cfg, args) -> int:
                     )
                 else:
                     cloud_resp = {"status": "error", "message": "user_denied"}
-                client.close()
                 if cloud_resp.get("status") == "success":
                     result = cloud_resp.get("result", {})
                     output = result.get("output", "")
@@ -2904,6 +3169,7 @@ def cmd_chat(cfg, args) -> int:
             interaction_history.append("You: " + user_input)
             transcript.append("You: " + user_input)
             session_transcript.append("You: " + user_input)
+            user_inputs.append(session_transcript[-1])
             try:
                 if not _privacy_enabled():
                     st = load_state()
@@ -2925,7 +3191,7 @@ def cmd_chat(cfg, args) -> int:
                     if plan_queue:
                         st = load_state()
                         st["action_queue"] = plan_queue
-                        st["action_queue_ts"] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+                        st["action_queue_ts"] = _utc_iso_now()
                         save_state(st)
                         log_event(st, "action_queue", count=len(plan_queue))
                         if len(plan_queue) > 3:
@@ -2934,7 +3200,7 @@ def cmd_chat(cfg, args) -> int:
                     plan_queue = []
             try:
                 intent_raw = step_details.get("user_intent_summary", "") or ""
-                intent_sanitized, changed = sanitize.sanitize_prompt(intent_raw)
+                intent_sanitized, changed = _sanitize_cached(intent_raw)
                 intent_summary = chat_ui.shorten_output(intent_sanitized, max_len=200)
                 logger.info(
                     "decision behavior=%s questions=%d redacted=%s",
@@ -2957,7 +3223,7 @@ def cmd_chat(cfg, args) -> int:
             if turn_bar: turn_bar.update(1)
 
             def _try_cloud(prompt: str, reason: str) -> Optional[str]:
-                client = LibrarianClient()
+                client = _get_librarian()
                 allow_cloud, sanitized_prompt = _confirm_cloud_send(prompt or "", approval_policy, agent_mode=agent_mode, as_json=False)
                 if allow_cloud:
                     cloud_resp = client.query_cloud(
@@ -2967,7 +3233,6 @@ def cmd_chat(cfg, args) -> int:
                     )
                 else:
                     cloud_resp = {"status": "error", "message": "user_denied"}
-                client.close()
                 if cloud_resp.get("status") == "success":
                     result = cloud_resp.get("result", {})
                     output = result.get("output", "")
@@ -3019,7 +3284,7 @@ def cmd_chat(cfg, args) -> int:
                     queue_ctx = []
             main_user = (
                 "Context (do not repeat):\n"
-                f"{json.dumps({'user_intent': step_details.get('user_intent_summary'), 'capability_inventory': step_details.get('inventory', []), 'snapshot': step_details.get('snapshot', {}), 'system': sys_ctx, 'memory': mem_ctx, 'last_command': last_cmd_summary, 'action_queue': queue_ctx}, ensure_ascii=False, indent=2)}\n\n"
+                f"{_dumps({'user_intent': step_details.get('user_intent_summary'), 'capability_inventory': step_details.get('inventory', []), 'snapshot': step_details.get('snapshot', {}), 'system': sys_ctx, 'memory': mem_ctx, 'last_command': last_cmd_summary, 'action_queue': queue_ctx}, indent=True)}\n\n"
                 "Guidance (do not repeat):\n"
                 f"{step_details.get('guidance_banner', '')}\n\n"
                 "Behavior (do not repeat):\n"
@@ -3050,13 +3315,11 @@ def cmd_chat(cfg, args) -> int:
                 "max_output_tokens": 1200,
             }
             stage_label = "thinking" if behavior_mode == "chat" else f"{behavior_mode} plan"
-            stop_event = threading.Event()
             label_state = {"label": stage_label}
-            _work_spinner(stage_label, stop_event, label_state)
             def _progress_cb(msg: str) -> None:
                 label_state["label"] = f"{stage_label} · {msg}"
-            bot_json = _post_responses(payload, label="Main", progress_cb=_progress_cb) # Use llm_utils's post_responses
-            stop_event.set()
+            with _work_spinner(stage_label, label_state):
+                bot_json = _post_responses(payload, label="Main", progress_cb=_progress_cb) # Use llm_utils's post_responses
             bot_response = _extract_output_text(bot_json) or ""
             interaction_history.append("martin: " + bot_response)
             if verbose_logging:
@@ -3126,7 +3389,7 @@ def cmd_chat(cfg, args) -> int:
                         "last_path": _LAST_PATH,
                         "last_listing": _LAST_LISTING[:20],
                     }
-                    return "Memory:\n" + json.dumps(mem, ensure_ascii=False)
+                    return "Memory:\n" + _dumps(mem)
 
                 if _LAST_PATH and any(k in text for k in ("navigate", "open", "look at", "list", "show", "read", "inspect")):
                     best = _best_listing_match(text)
@@ -3215,7 +3478,7 @@ def cmd_chat(cfg, args) -> int:
             intent_summary = intent_raw
             changed = False
             try:
-                intent_sanitized, changed = sanitize.sanitize_prompt(intent_raw)
+                intent_sanitized, changed = _sanitize_cached(intent_raw)
                 intent_summary = chat_ui.shorten_output(intent_sanitized, max_len=200)
             except Exception:
                 pass
@@ -3458,7 +3721,7 @@ def cmd_chat(cfg, args) -> int:
                     try:
                         st = load_state()
                         st["last_command_summary"] = {
-                            "ts": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                            "ts": _utc_iso_now(),
                             "cmd": step.get("cmd"),
                             "rc": step.get("rc"),
                             "ok": True,
@@ -3538,7 +3801,7 @@ def cmd_chat(cfg, args) -> int:
                     try:
                         st = load_state()
                         st["last_command_summary"] = {
-                            "ts": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                            "ts": _utc_iso_now(),
                             "cmd": step.get("cmd"),
                             "rc": step.get("rc"),
                             "ok": False,
@@ -3762,7 +4025,7 @@ def cmd_chat(cfg, args) -> int:
         try:
             st = load_state()
             snapshot = {
-                "ts": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                "ts": _utc_iso_now(),
                 "last_path": _LAST_PATH,
                 "last_listing": _LAST_LISTING[:100],
             }
@@ -3791,7 +4054,7 @@ def cmd_chat(cfg, args) -> int:
         if not _privacy_enabled():
             st = load_state()
             st["resume_snapshot"] = {
-                "ts": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                "ts": _utc_iso_now(),
                 "last_path": _LAST_PATH,
                 "last_listing": _LAST_LISTING[:100],
                 "last_plan": st.get("last_plan", {}),
@@ -3803,8 +4066,7 @@ def cmd_chat(cfg, args) -> int:
     except Exception:
         pass
     try:
-        if readline_mod and history_path:
-            readline_mod.write_history_file(str(history_path))
+        chat_ui.persist_new_history(readline_mod, history_path)
     except Exception:
         pass
     return 0
@@ -3858,21 +4120,22 @@ def build_parser() -> argparse.ArgumentParser:
     return parser
 
 
-def main(argv: List[str] = None) -> int:
-    cfg = load_config()
-    try:
-        from researcher import llm_utils
-        ui_cfg = cfg.get("ui", {}) or {}
-        llm_utils.SHOW_API_BARS = bool(ui_cfg.get("api_progress", False))
-    except Exception:
-        pass
-    parser = build_parser()
+def main(argv: List[str] = None) -> int:
+    # Parse first: --help, --version and usage errors exit before config is read or LLM helpers load.
+    parser = build_parser()
     if argv is None:
         argv = sys.argv[1:]
     if "--version" in argv:
         print(__version__)
         return 0
     args = parser.parse_args(argv)
+    cfg = _cfg_cached()
+    try:
+        from researcher import llm_utils
+        ui_cfg = cfg.get("ui", {}) or {}
+        llm_utils.SHOW_API_BARS = bool(ui_cfg.get("api_progress", False))
+    except Exception:
+        pass
     if not getattr(args, "command", None):
         return cmd_chat(cfg, argparse.Namespace(transcript=""))
     try:
@@ -4249,7 +4512,7 @@ def handle_librarian(cfg, args) -> int:
                             
                     if last_error:
                         print("\n--- Last Recorded Librarian Error ---")
-                        print(json.dumps(last_error, indent=2))
+                        print(_dumps(last_error, indent=True))
                         print("------------------------------------")
                     else:
                         print("No specific librarian error was found in the ledger.")
@@ -4292,7 +4555,7 @@ def add_resources_command(sub):
 def handle_resources(cfg, args) -> int:
     from researcher.resource_registry import list_resources
     items = list_resources(max_items=args.max_items, max_depth=args.max_depth)
-    print(json.dumps({"root": str(ROOT_DIR), "items": items}, ensure_ascii=False, indent=2))
+    print(_dumps({"root": str(ROOT_DIR), "items": items}, indent=True))
     return 0
 
 
@@ -4300,7 +4563,7 @@ def handle_resource(cfg, args) -> int:
     from researcher.resource_registry import read_resource
     ok, result = read_resource(args.path, max_bytes=args.max_bytes)
     result["ok"] = ok
-    print(json.dumps(result, ensure_ascii=False, indent=2))
+    print(_dumps(result, indent=True))
     return 0
     ok, output = dispatch_internal_ability(args.name, args.payload or "")
     if ok:
@@ -4316,6 +4579,7 @@ def add_tui_command(sub):
 
 
 def handle_tui(cfg, args) -> int:
+    from researcher.tui_shell import run_tui
     run_tui()
     return 0
 
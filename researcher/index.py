@@ -46,6 +46,11 @@ class SimpleIndex:
         self.vectors.append(embed_text(text))
         self.meta.append(meta)
 
+    def add_batch(self, texts: List[str], metas: List[Dict[str, Any]]) -> None:
+        """Batch counterpart of add(), mirroring FaissIndex.add(texts, metas)."""
+        self.vectors.extend(embed_text(t) for t in texts)
+        self.meta.extend(metas)
+
     def search(self, query: str, k: int = 5) -> List[Tuple[float, Dict[str, Any]]]:
         if not self.vectors:
             return []
@@ -98,22 +103,30 @@ class FaissIndex:
             faiss = _load_faiss()
             self.index = faiss.IndexFlatIP(dim)
 
+    def embed(self, texts: List[str]) -> Any:
+        """L2-normalized float32 embeddings, one row per text."""
+        np = _load_numpy()
+        self._ensure_model()
+        return np.asarray(self.model.encode(texts, normalize_embeddings=True), dtype="float32")
+
     def add(self, texts: List[str], metas: List[Dict[str, Any]]) -> None:
         if not texts:
             return
-        np = _load_numpy()
-        self._ensure_model()
-        embeddings = self.model.encode(texts, normalize_embeddings=True)
+        embeddings = self.embed(texts)
         self._ensure_index(embeddings.shape[1])
-        self.index.add(np.array(embeddings, dtype="float32"))
+        self.index.add(embeddings)
         self.meta.extend(metas)
 
     def search(self, query: str, k: int = 5) -> List[Tuple[float, Dict[str, Any]]]:
         if self.index is None or not self.meta:
             return []
-        self._ensure_model()
-        q = self.model.encode([query], normalize_embeddings=True)
-        scores, idxs = self.index.search(np.array(q, dtype="float32"), k)
+        return self.search_vector(self.embed([query])[0], k=k)
+
+    def search_vector(self, qvec: Any, k: int = 5) -> List[Tuple[float, Dict[str, Any]]]:
+        """Search with a query vector from embed(), so callers that already embedded skip a second encode."""
+        if self.index is None or not self.meta:
+            return []
+        scores, idxs = self.index.search(qvec.reshape(1, -1), k)
         out = []
         for score, idx in zip(scores[0], idxs[0]):
             if idx < 0 or idx >= len(self.meta):
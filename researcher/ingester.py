@@ -1,22 +1,25 @@
 import re
 from pathlib import Path
-from typing import Iterable, List, Dict, Any, Optional
+from typing import Iterable, Iterator, List, Dict, Any, Optional
 
 from researcher.index import SimpleIndex, FaissIndex
 
 
-def simple_chunk(text: str, max_chars: int = 800, overlap: int = 80) -> List[str]:
+def iter_chunks(text: str, max_chars: int = 800, overlap: int = 80) -> Iterator[str]:
+    """Yield overlapping windows of whitespace-normalized text; never yields empty chunks."""
     cleaned = re.sub(r"\s+", " ", text).strip()
-    chunks: List[str] = []
     start = 0
     n = len(cleaned)
     while start < n:
         end = min(n, start + max_chars)
-        chunks.append(cleaned[start:end])
+        yield cleaned[start:end]
         if end == n:
             break
         start = end - overlap
-    return [c for c in chunks if c]
+
+
+def simple_chunk(text: str, max_chars: int = 800, overlap: int = 80) -> List[str]:
+    return list(iter_chunks(text, max_chars=max_chars, overlap=overlap))
 
 
 def ingest_files(idx, files: Iterable[Path], trust_label: Optional[str] = None, source_type: str = "") -> Dict[str, Any]:
@@ -3,6 +3,7 @@ import time
 import json
 import socket
 import struct
+import threading
 import uuid
 from pathlib import Path
 from typing import Dict, Any, Optional, List, Tuple
@@ -23,6 +24,7 @@ AUTH_TOKEN_ENV = "LIBRARIAN_IPC_TOKEN"
 MAX_MSG_BYTES = int(os.getenv("LIBRARIAN_IPC_MAX_BYTES", 1024 * 1024))
 CHUNK_BYTES = int(os.getenv("LIBRARIAN_IPC_CHUNK_BYTES", 60_000))
 MAX_CHUNKS = int(os.getenv("LIBRARIAN_IPC_MAX_CHUNKS", 200))
+_STALE = object()
 
 class LibrarianClient:
     """
@@ -31,6 +33,7 @@ class LibrarianClient:
     def __init__(self, address: Tuple[str, int] = None) -> None:
         self.address = address or LIBRARIAN_ADDR
         self._conn: Optional[socket.socket] = None
+        self._lock = threading.RLock()
         self.last_request_id: Optional[str] = None
 
     def _connect(self) -> bool:
@@ -56,6 +59,33 @@ class LibrarianClient:
 
     def _send_receive(self, message: Dict[str, Any]) -> Dict[str, Any]:
         """Sends a message to the Librarian and waits for a response."""
+        with self._lock:
+            if self._conn is not None and not self._conn_alive():
+                # A restarted Librarian closes kept-alive sockets; reconnect before sending anything.
+                self.close()
+            if self._conn is not None:
+                # Resend only when sendall itself failed: once the request is out, the Librarian
+                # may have acted on it (ingest, paid cloud query) even if no reply comes back.
+                response = self._exchange(message, stale_ok=True)
+                if response is not _STALE:
+                    return response
+            return self._exchange(message)
+
+    def _conn_alive(self) -> bool:
+        """Non-blocking MSG_PEEK on the kept-alive socket; EOF or an error means the peer is gone."""
+        try:
+            self._conn.setblocking(False)
+            try:
+                data = self._conn.recv(1, socket.MSG_PEEK)
+            finally:
+                self._conn.settimeout(LIBRARIAN_TIMEOUT_S)
+        except (BlockingIOError, InterruptedError):
+            return True
+        except OSError:
+            return False
+        return bool(data)
+
+    def _exchange(self, message: Dict[str, Any], stale_ok: bool = False) -> Any:
         if not self._connect():
             return {"status": "error", "message": "Failed to connect to Librarian."}
         
@@ -71,7 +101,13 @@ class LibrarianClient:
             if len(msg_json) > MAX_MSG_BYTES:
                 return {"status": "error", "message": "payload too large", "request_id": request_id}
             msg_len = struct.pack('!I', len(msg_json))
-            self._conn.sendall(msg_len + msg_json)
+            try:
+                self._conn.sendall(msg_len + msg_json)
+            except (BrokenPipeError, ConnectionResetError):
+                if not stale_ok:
+                    raise
+                self.close()
+                return _STALE
 
             # Receive response length
             resp_len_bytes = self._conn.recv(4)
@@ -1,12 +1,29 @@
+import atexit
 import json
 from typing import Optional, Callable, Dict, Any
 
+_HTTP = None
+
+
+def _get_http():
+    """Shared keep-alive session so status, ask and fallback calls reuse Ollama connections."""
+    global _HTTP
+    if _HTTP is None:
+        import requests
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=0)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        atexit.register(session.close)
+        _HTTP = session
+    return _HTTP
+
 
 def check_ollama_health(host: str = "http://localhost:11434", model: str = "") -> Dict[str, Any]:
     import requests
     url = f"{host.rstrip('/')}/api/tags"
     try:
-        resp = requests.get(url, timeout=5)
+        resp = _get_http().get(url, timeout=5)
         if resp.status_code != 200:
             return {"ok": False, "model": model, "status": resp.status_code}
         data = resp.json()
@@ -21,7 +38,7 @@ def run_ollama_chat(model: str, prompt: str, host: str = "http://localhost:11434
     url = f"{host.rstrip('/')}/api/chat"
     payload = {"model": model, "messages": [{"role": "user", "content": prompt}]}
     try:
-        resp = requests.post(url, json=payload, timeout=60)
+        resp = _get_http().post(url, json=payload, timeout=60)
         if resp.status_code != 200:
             return None
         # Newer Ollama streams; but standard chat returns json with "message"
@@ -50,25 +67,26 @@ def run_ollama_chat_stream(
         "messages": [{"role": "user", "content": prompt}],
     }
     try:
-        resp = requests.post(url, json=payload, timeout=60, stream=True)
-        if resp.status_code != 200:
-            return None
         chunks: list[str] = []
-        for line in resp.iter_lines():
-            if not line:
-                continue
-            try:
-                data = json.loads(line.decode("utf-8"))
-            except Exception:
-                continue
-            if data.get("done") is True:
-                break
-            msg = data.get("message") or {}
-            content = msg.get("content")
-            if isinstance(content, str) and content:
-                chunks.append(content)
-                if on_token:
-                    on_token(content)
+        # Closing the streamed response hands the connection back to the pool.
+        with _get_http().post(url, json=payload, timeout=60, stream=True) as resp:
+            if resp.status_code != 200:
+                return None
+            for line in resp.iter_lines():
+                if not line:
+                    continue
+                try:
+                    data = json.loads(line.decode("utf-8"))
+                except Exception:
+                    continue
+                if data.get("done") is True:
+                    break
+                msg = data.get("message") or {}
+                content = msg.get("content")
+                if isinstance(content, str) and content:
+                    chunks.append(content)
+                    if on_token:
+                        on_token(content)
         return "".join(chunks).strip() if chunks else None
     except (requests.RequestException, json.JSONDecodeError):
         return None
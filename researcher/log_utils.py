@@ -5,8 +5,18 @@ from pathlib import Path
 from typing import Optional
 
 
+class _LazyRotatingFileHandler(RotatingFileHandler):
+    """Rotating handler that creates its directory and opens the file on the first record."""
+
+    def __init__(self, path: Path, **kwargs) -> None:
+        super().__init__(path, delay=True, **kwargs)
+
+    def _open(self):
+        Path(self.baseFilename).parent.mkdir(parents=True, exist_ok=True)
+        return super()._open()
+
+
 def setup_logger(path: Path, name: str = "researcher", max_bytes: int = 2_000_000, backups: int = 3) -> logging.Logger:
-    path.parent.mkdir(parents=True, exist_ok=True)
     logger = logging.getLogger(name)
     if logger.handlers:
         if os.environ.get("MARTIN_LOG_STDOUT") != "1":
@@ -15,7 +25,8 @@ def setup_logger(path: Path, name: str = "researcher", max_bytes: int = 2_000_00
                     logger.removeHandler(h)
         return logger
     logger.setLevel(logging.INFO)
-    fh = RotatingFileHandler(path, encoding="utf-8", maxBytes=max_bytes, backupCount=backups)
+    # Commands that never log (e.g. `status --json` in a script) skip the mkdir and file open.
+    fh = _LazyRotatingFileHandler(path, encoding="utf-8", maxBytes=max_bytes, backupCount=backups)
     fmt = logging.Formatter("%(asctime)s %(levelname)s %(message)s")
     fh.setFormatter(fmt)
     logger.addHandler(fh)
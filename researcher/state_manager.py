@@ -5,6 +5,11 @@ import datetime
 from pathlib import Path
 from typing import Any, Dict, Optional, List
 
+try:
+    import orjson
+except Exception:
+    orjson = None
+
 from researcher import __version__
 from researcher import sanitize
 from researcher.config_loader import load_config
@@ -37,8 +42,14 @@ def _read_json(path: Path, default: Any) -> Any:
     if not path.exists():
         return default
     try:
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
+        raw = path.read_bytes()
+        if orjson is not None:
+            try:
+                return orjson.loads(raw)
+            except orjson.JSONDecodeError:
+                # Stdlib json accepts NaN/Infinity, which older state files may contain.
+                pass
+        return json.loads(raw)
     except Exception:
         # Log error in future
         return default
@@ -47,8 +58,19 @@ def _write_json(path: Path, data: Any) -> None:
     """Writes data to a JSON file atomically."""
     path.parent.mkdir(parents=True, exist_ok=True)
     tmp = path.with_suffix(path.suffix + ".tmp")
-    with open(tmp, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+    payload = None
+    if orjson is not None:
+        # Same indented layout as the stdlib path, serialized straight to bytes.
+        try:
+            payload = orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            payload = None
+    if payload is not None:
+        with open(tmp, "wb") as f:
+            f.write(payload)
+    else:
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
     os.replace(tmp, path)
 
 # --- State management ---
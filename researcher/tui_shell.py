@@ -253,7 +253,7 @@ def run_tui() -> None:
     root = Path.cwd()
     fast_ctx = not (root / ".git").exists()
     context = gather_context(root, max_recent=10, fast=fast_ctx)
-    palette_entries = chat_ui.build_palette_entries("", chat_ui.get_slash_commands(), [])
+    palette_entries = chat_ui.build_palette_entries("", chat_ui.SLASH_COMMANDS, [])
     palette_items = [{"kind": kind, "value": value} for kind, value in palette_entries]
     tasks = _load_tasks(st)
     outputs_dir = root / "logs" / "outputs"
@@ -326,7 +326,7 @@ def run_tui() -> None:
             st = load_state()
             tests_last = st.get("tests_last", {}) if isinstance(st, dict) else {}
             if view == "palette":
-                palette_entries = chat_ui.build_palette_entries("", chat_ui.get_slash_commands(), [])
+                palette_entries = chat_ui.build_palette_entries("", chat_ui.SLASH_COMMANDS, [])
                 palette_items = [{"kind": kind, "value": value} for kind, value in palette_entries]
                 selections["palette"] = _clamp_selection(selections["palette"], palette_items)
                 left = _render_palette(palette_items, selections["palette"])
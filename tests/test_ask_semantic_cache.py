@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+from researcher import cli
+from researcher.index import FaissIndex
+
+SCOPE = (5, False, "off")
+VECTORS = {
+    "how do I install numpy": np.array([1.0, 0.0, 0.0], dtype="float32"),
+    "how can I install numpy": np.array([0.99, 0.141, 0.0], dtype="float32"),
+    "what is faiss": np.array([0.0, 1.0, 0.0], dtype="float32"),
+}
+
+
+class FakeFaissIndex(FaissIndex):
+    def __init__(self):
+        super().__init__()
+        self.index = object()
+        self.meta = [{"path": "doc"}]
+
+    def embed(self, texts):
+        return np.stack([VECTORS[t] for t in texts])
+
+
+@pytest.fixture(autouse=True)
+def _clean_caches(monkeypatch):
+    monkeypatch.setattr(cli, "_ASK_CACHE", cli.OrderedDict())
+    monkeypatch.setattr(cli, "_SEM_CACHE", cli.OrderedDict())
+
+
+def _put(key, prompt, scope=SCOPE):
+    cli._ask_cache_put(key, {"answer": key}, VECTORS[prompt], scope)
+
+
+def test_lookup_hit_and_miss():
+    _put("a", "how do I install numpy")
+    assert cli._semantic_cache_lookup(VECTORS["how can I install numpy"], 0.95, SCOPE) == "a"
+    assert cli._semantic_cache_lookup(VECTORS["what is faiss"], 0.95, SCOPE) is None
+
+
+def test_lookup_respects_threshold():
+    _put("a", "how do I install numpy")
+    assert cli._semantic_cache_lookup(VECTORS["how can I install numpy"], 0.999, SCOPE) is None
+
+
+def test_lookup_ignores_other_scopes():
+    _put("a", "how do I install numpy", scope=(5, True, "off"))
+    assert cli._semantic_cache_lookup(VECTORS["how do I install numpy"], 0.95, SCOPE) is None
+
+
+def test_eviction_prunes_semantic_entries(monkeypatch):
+    monkeypatch.setattr(cli, "_ASK_CACHE_MAX", 2)
+    _put("a", "how do I install numpy")
+    _put("b", "what is faiss")
+    _put("c", "what is faiss")
+    assert list(cli._ASK_CACHE) == ["b", "c"]
+    assert "a" not in cli._SEM_CACHE
+    assert cli._semantic_cache_lookup(VECTORS["how can I install numpy"], 0.95, SCOPE) is None
+
+
+def test_probe_is_off_by_default():
+    _put("a", "how do I install numpy")
+    assert cli._semantic_probe(FakeFaissIndex(), "how can I install numpy", {}, SCOPE) == (None, None)
+
+
+def test_probe_with_fake_faiss_index():
+    _put("a", "how do I install numpy")
+    qvec, key = cli._semantic_probe(FakeFaissIndex(), "how can I install numpy", {"enabled": True}, SCOPE)
+    assert key == "a"
+    assert np.allclose(qvec, VECTORS["how can I install numpy"])
@@ -1,3 +1,5 @@
+import os
+
 from researcher import chat_ui
 
 
@@ -31,3 +33,69 @@ def test_palette_entries_search_sources(tmp_path):
 
     entries = chat_ui.build_palette_entries("run", ["/help"], [], root=tmp_path)
     assert any(k == "output" for k, _ in entries)
+
+
+def test_fuzzy_match_subsequence():
+    assert chat_ui._fuzzy_match("hst", "/history")
+    assert chat_ui._fuzzy_match("HIS", "/history")
+    assert chat_ui._fuzzy_match("", "/help")
+    assert not chat_ui._fuzzy_match("yh", "/history")
+    assert not chat_ui._fuzzy_match("a.b", "/axb")
+
+
+def test_complete_path_prefix(tmp_path):
+    (tmp_path / "alpha.txt").write_text("a", encoding="utf-8")
+    (tmp_path / "alps").mkdir()
+    (tmp_path / ".alpha").write_text("h", encoding="utf-8")
+    (tmp_path / "beta.md").write_text("b", encoding="utf-8")
+    hits = chat_ui._complete_path(str(tmp_path / "al"))
+    assert hits == [str(tmp_path / "alpha.txt"), str(tmp_path / "alps") + os.sep]
+    assert chat_ui._complete_path(str(tmp_path / ".al")) == [str(tmp_path / ".alpha")]
+
+
+def test_palette_entries_use_tracked_inputs():
+    entries = chat_ui.build_palette_entries("", ["/help"], ["You: stale"], user_inputs=["You: one", "You: two"])
+    inputs = [v for k, v in entries if k == "input"]
+    assert inputs == ["You: one", "You: two"]
+
+
+def test_prefix_matches_sorted():
+    cmds = sorted(["/help", "/history", "/host", "/clear"])
+    assert chat_ui._prefix_matches(cmds, "/h") == ["/help", "/history", "/host"]
+    assert chat_ui._prefix_matches(cmds, "/hi") == ["/history"]
+    assert chat_ui._prefix_matches(cmds, "/x") == []
+
+
+def test_cached_completions_reuses_within_ttl():
+    calls = []
+
+    def compute(buf):
+        calls.append(buf)
+        return [buf + "x"]
+
+    chat_ui._COMPL_CACHE.clear()
+    assert chat_ui._cached_completions("/he", compute) == ["/hex"]
+    assert chat_ui._cached_completions("/he", compute) == ["/hex"]
+    assert calls == ["/he"]
+    chat_ui._cached_completions("./dir/", compute)
+    chat_ui._cached_completions("./dir/", compute)
+    assert calls == ["/he", "./dir/", "./dir/"]
+
+
+def test_input_history_search_and_tail():
+    hist = chat_ui.InputHistory(maxlen=3)
+    for ln in ["You: Alpha", "You: beta", "You: ALPHABET", "You: gamma"]:
+        hist.append(ln)
+    assert len(hist) == 3
+    assert chat_ui._matching(hist, "alpha") == ["You: ALPHABET"]
+    assert chat_ui._tail(hist, 2) == ["You: ALPHABET", "You: gamma"]
+
+
+def test_file_entries_refresh_on_root_change(tmp_path):
+    (tmp_path / "alpha.txt").write_text("a", encoding="utf-8")
+    assert chat_ui.build_file_entries("alp", max_items=10, max_depth=2, root=tmp_path) == ["alpha.txt"]
+    before = tmp_path.stat().st_mtime_ns
+    (tmp_path / "alpine.md").write_text("b", encoding="utf-8")
+    # Coarse filesystem timestamps can leave the directory mtime unchanged; bump it explicitly.
+    os.utime(tmp_path, ns=(before + 10**9, before + 10**9))
+    assert sorted(chat_ui.build_file_entries("alp", max_items=10, max_depth=2, root=tmp_path)) == ["alpha.txt", "alpine.md"]
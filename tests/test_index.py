@@ -22,3 +22,13 @@ def test_simple_index_save_load(tmp_path: Path):
     loaded = SimpleIndex.load(out)
     hits = loaded.search("content", k=1)
     assert hits and hits[0][1]["path"] == "doc"
+
+
+def test_simple_index_add_batch_matches_add():
+    single = SimpleIndex()
+    single.add("alpha", {"path": "a"})
+    single.add("beta", {"path": "b"})
+    batched = SimpleIndex()
+    batched.add_batch(["alpha", "beta"], [{"path": "a"}, {"path": "b"}])
+    assert batched.meta == single.meta
+    assert [list(v) for v in batched.vectors] == [list(v) for v in single.vectors]
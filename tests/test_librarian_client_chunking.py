@@ -21,3 +21,85 @@ def test_librarian_client_chunking(monkeypatch):
     assert resp.get("status") == "success"
     assert len(sent) == 10
     assert all(m.get("type") == "ingest_text_chunk" for m in sent)
+
+
+def _serve(handler):
+    """Accept connections on a local port; handler(conn_index, message) returns a reply or None to hang up."""
+    import json
+    import socket
+    import struct
+    import threading
+
+    srv = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    srv.bind(("127.0.0.1", 0))
+    srv.listen(4)
+    received = []
+    closed = threading.Event()
+
+    def _recv_exact(conn, n):
+        buf = b""
+        while len(buf) < n:
+            chunk = conn.recv(n - len(buf))
+            if not chunk:
+                return None
+            buf += chunk
+        return buf
+
+    def _run():
+        conn_index = 0
+        while True:
+            try:
+                conn, _ = srv.accept()
+            except OSError:
+                return
+            with conn:
+                while True:
+                    head = _recv_exact(conn, 4)
+                    if head is None:
+                        break
+                    message = json.loads(_recv_exact(conn, struct.unpack("!I", head)[0]))
+                    received.append((conn_index, message))
+                    reply = handler(conn_index, message)
+                    if reply is None:
+                        break
+                    reply.update(protocol_version=message["protocol_version"], request_id=message["request_id"])
+                    body = json.dumps(reply).encode("utf-8")
+                    conn.sendall(struct.pack("!I", len(body)) + body)
+                    if reply.get("hang_up"):
+                        break
+            closed.set()
+            conn_index += 1
+
+    threading.Thread(target=_run, daemon=True).start()
+    return srv, received, closed
+
+
+def test_librarian_client_reconnects_idle_dropped_connection():
+    import researcher.librarian_client as lc
+
+    srv, received, closed = _serve(lambda i, m: {"status": "success", "hang_up": True})
+    client = lc.LibrarianClient(address=srv.getsockname())
+    try:
+        assert client._send_receive({"type": "ping"})["status"] == "success"
+        assert closed.wait(5)
+        assert client._send_receive({"type": "ping"})["status"] == "success"
+    finally:
+        client.close()
+        srv.close()
+    assert [i for i, _ in received] == [0, 1]
+
+
+def test_librarian_client_does_not_resend_after_request_delivered():
+    import researcher.librarian_client as lc
+
+    # First request is answered on a kept-alive connection; the second is read, then dropped unanswered.
+    srv, received, _closed = _serve(lambda i, m: {"status": "success"} if m["type"] == "ping" else None)
+    client = lc.LibrarianClient(address=srv.getsockname())
+    try:
+        assert client._send_receive({"type": "ping"})["status"] == "success"
+        resp = client._send_receive({"type": "ingest_text"})
+    finally:
+        client.close()
+        srv.close()
+    assert resp["status"] == "error"
+    assert [m["type"] for _, m in received] == ["ping", "ingest_text"]
@@ -0,0 +1,178 @@
+import json
+
+import pytest
+
+import martin_v5_1_reference as martin
+
+
+EXISTING = {"/etc/hosts", "/srv/out.txt", "/tmp/out.txt", "/dev/null"}
+
+
+@pytest.fixture(autouse=True)
+def _fake_fs(monkeypatch):
+    monkeypatch.setattr(martin, "_dest_exists", lambda path: path in EXISTING)
+
+
+@pytest.mark.parametrize(
+    "cmd,need,dest",
+    [
+        ("echo hi > /srv/out.txt", True, "/srv/out.txt"),
+        ("echo hi > /srv/new.txt", False, None),
+        ("echo hi > /tmp/out.txt", False, "/tmp/out.txt"),
+        ("ls > /dev/null", False, None),
+        ("echo hi | tee /srv/out.txt", True, "/srv/out.txt"),
+        ("echo hi | tee -a /srv/out.txt", False, None),
+        ("cat x | sudo tee /etc/hosts", True, "/etc/hosts"),
+        ("sudo cp a /etc/hosts", True, "/etc/hosts"),
+        ("mv a b && cp c /srv/out.txt", True, "/srv/out.txt"),
+        ("grep x f | sort > /srv/out.txt", True, "/srv/out.txt"),
+        ("ls -la", False, None),
+    ],
+)
+def test_needs_overwrite_confirmation(cmd, need, dest):
+    got_need, got_dest, _cls = martin.needs_overwrite_confirmation(cmd)
+    assert (got_need, got_dest) == (need, dest)
+
+
+def test_parse_command_segments():
+    segs = martin.parse_command('cd /tmp && echo "a && b" | grep a > out.txt')
+    assert [s["argv"] for s in segs] == [("cd", "/tmp"), ("echo", "a && b"), ("grep", "a")]
+    assert [s["redirects"] for s in segs] == [(), (), ("out.txt",)]
+
+
+@pytest.mark.parametrize(
+    "cmd,argv",
+    [
+        ("ls -la /tmp", ["ls", "-la", "/tmp"]),
+        ("git status", ["git", "status"]),
+        ("echo $HOME", None),
+        ("ls | wc -l", None),
+        ("ls > out.txt", None),
+        ("make && make install", None),
+        ("ls *.py", None),
+        ("ls ~", None),
+        ("echo 'quoted'", None),
+        ("FOO=1 make", None),
+        ("cd /tmp", None),
+        ("export PATH", None),
+        ("", None),
+    ],
+)
+def test_direct_argv(cmd, argv):
+    assert martin._direct_argv(cmd) == argv
+
+
+@pytest.mark.parametrize(
+    "first,second,action",
+    [
+        ("Do you want to continue? [Y", "/n] ", "AUTO_Y"),
+        ("Press Ent", "er to continue", "ENTER"),
+        ("Overwrite /tmp/a? ", "y/N", "OVERWRITE"),
+        ("Proceed? (y", "/n) ", "ASK"),
+    ],
+)
+def test_prompt_split_across_reads(first, second, action):
+    pm, _window, tail = martin._scan_prompt("", first)
+    assert pm is None and tail == first
+    pm, _window, tail = martin._scan_prompt(tail, second)
+    assert pm is not None and pm.lastgroup == action
+    assert tail == ""
+
+
+def test_prompt_tail_is_bounded():
+    _pm, _window, tail = martin._scan_prompt("", "x" * (martin.PROMPT_TAIL_CHARS * 2))
+    assert len(tail) == martin.PROMPT_TAIL_CHARS
+
+
+def test_default_no_is_not_auto_yes():
+    pm, _window, _tail = martin._scan_prompt("", "Continue? [y/N]")
+    assert pm.lastgroup == "ASK"
+
+
+def test_extract_plan():
+    text = (
+        "Let me handle that.\n"
+        "command: martin.search foo bar\n"
+        "  command: martin.note:hello\n"
+        "command: cd /tmp\n"
+        "command: `ls -la`\n"
+    )
+    assert martin.extract_plan(text) == [
+        ("martin.search foo bar", "search", "foo bar"),
+        ("martin.note:hello", "note", "hello"),
+        ("cd /tmp", None, None),
+        ("cd /tmp && ls -la", None, None),
+    ]
+    assert martin.extract_plan("no commands here") == []
+
+
+class _FakeStream:
+    status_code = 200
+    headers: dict = {}
+
+    def __init__(self, lines, fail_after=None):
+        self.lines = lines
+        self.fail_after = fail_after
+
+    def iter_lines(self):
+        for i, line in enumerate(self.lines):
+            if i == self.fail_after:
+                raise martin.requests.RequestException("connection reset")
+            yield line
+
+    def close(self):
+        pass
+
+
+def _delta(text):
+    return b"data: " + json.dumps({"type": "response.output_text.delta", "delta": text}).encode()
+
+
+def _stub_session(monkeypatch, responses):
+    calls = []
+
+    class _Session:
+        def post(self, *args, **kwargs):
+            calls.append(kwargs)
+            return responses[len(calls) - 1]
+
+    monkeypatch.setattr(martin, "_SESSION", _Session())
+    monkeypatch.setattr(martin, "SHOW_API_BARS", False)
+    monkeypatch.setattr(martin.time, "sleep", lambda s: None)
+    return calls
+
+
+def test_stream_interrupted_after_delta_is_not_retried(monkeypatch):
+    calls = _stub_session(monkeypatch, [_FakeStream([_delta("Hel"), _delta("lo")], fail_after=1)])
+    seen = []
+    out = martin._post_responses({"model": "m"}, label="Main", on_delta=seen.append)
+    assert len(calls) == 1
+    assert seen == ["Hel"]
+    assert out["output_text"] == "Hel"
+    assert out["incomplete_details"]["reason"] == "stream_interrupted"
+
+
+def test_stream_interrupted_before_delta_is_retried(monkeypatch):
+    calls = _stub_session(monkeypatch, [
+        _FakeStream([_delta("x")], fail_after=0),
+        _FakeStream([_delta("ok"), b"data: [DONE]"]),
+    ])
+    out = martin._post_responses({"model": "m"}, label="Main", on_delta=lambda d: None)
+    assert len(calls) == 2
+    assert out == {"output_text": "ok"}
+
+
+def test_truncated_reply_yields_no_plan(monkeypatch):
+    reply = "Cleaning up.\ncommand: ls\ncommand: rm -rf build/tmp"
+    cut = reply.index("/tmp")
+    _stub_session(monkeypatch, [_FakeStream([_delta(reply[:cut]), _delta(reply[cut:])], fail_after=1)])
+    out = martin._post_responses({"model": "m"}, label="Main", on_delta=lambda d: None)
+    assert out["output_text"].endswith("rm -rf build")
+    assert martin.reply_plan(out, out["output_text"]) == []
+    assert [c for c, _, _ in martin.reply_plan({"output_text": reply}, reply)] == ["ls", "rm -rf build/tmp"]
+
+
+def test_read_json_accepts_nan_written_by_stdlib(tmp_path):
+    path = tmp_path / "state.json"
+    path.write_text(json.dumps({"score": float("nan"), "n": 1}), encoding="utf-8")
+    assert martin._read_json(path, {"reset": True})["n"] == 1
@@ -0,0 +1,17 @@
+import json
+
+from researcher.state_manager import _read_json, _write_json
+
+
+def test_read_json_accepts_nan_written_by_stdlib(tmp_path):
+    path = tmp_path / "state.json"
+    path.write_text(json.dumps({"score": float("nan"), "n": 1}), encoding="utf-8")
+    data = _read_json(path, {"reset": True})
+    assert data["n"] == 1
+    assert data["score"] != data["score"]
+
+
+def test_write_read_roundtrip(tmp_path):
+    path = tmp_path / "state.json"
+    _write_json(path, {"a": [1, 2], "b": "é"})
+    assert _read_json(path, {}) == {"a": [1, 2], "b": "é"}